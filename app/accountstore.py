@@ -0,0 +1,123 @@
+"""Per-user sharded JSON storage.
+
+accounts.json is a small index of accounts (username, password hash and the
+path of the user's shard). Each user's tasks live in their own shard file under
+`<accounts file>.d/`, and both the index and every shard are persisted as a
+snapshot plus journal (see journal.py). Shards are only read when a user logs
+in, and a task change only touches that user's shard.
+
+Files in the old single-file format, where every account carries its tasks, are
+migrated on load: the shards are written first and the index is swapped in
+last, so an interrupted migration simply runs again.
+"""
+import hashlib
+import os
+from journal import JournalStore, apply_task_op, atomic_write_json
+from taskmodel import compact_tasks
+
+FORMAT_VERSION = 2
+
+def _empty_shard():
+    return {"tasks": []}
+
+class ShardedAccountStore:
+    def __init__(self, path, autoflush=True):
+        self.path = path
+        self.base_dir = os.path.dirname(os.path.abspath(path))
+        self.shard_dir = path + ".d"
+        self.autoflush = autoflush
+        self.index = JournalStore(path, autoflush=autoflush)
+        self.shards = {}  # username -> JournalStore, filled lazily
+        self.by_username = {}  # username -> account entry of the index
+
+    def load(self):
+        """Load the account index only; tasks are read per user on demand."""
+        accounts = self.index.load()
+        if accounts.get("format") != FORMAT_VERSION:
+            self._migrate(accounts)
+        self.by_username = {account["username"]: account for account in accounts["accounts"]}
+        return accounts
+
+    def account(self, username):
+        """Return the index entry of a user, or None, without scanning the account list."""
+        return self.by_username.get(username)
+
+    def tasks(self, username):
+        """Return the task list of a user, reading their shard on first use."""
+        return self._shard(username).doc["tasks"]
+
+    def apply(self, op):
+        """Apply a mutation: account changes go to the index, task changes to the user's shard."""
+        if op["op"] == "create_account":
+            op = dict(op, shard=self._shard_name(op["username"]))
+            self._remove_shard_files(op["shard"])  # Leftovers of an older account with the same name
+            self.index.apply(op)
+            self.by_username[op["username"]] = self.index.doc["accounts"][-1]
+        elif op["op"] == "set_password_hash":
+            self.index.apply(op)  # Updates the entry by_username points at
+        elif op["op"] == "delete_account":
+            shard = self._account_shard(op["username"])
+            self.index.apply(op)
+            self.index.flush()  # The shard files go now, so the index must not lag behind
+            self.by_username.pop(op["username"], None)
+            self.shards.pop(op["username"], None)
+            if shard:
+                self._remove_shard_files(shard)
+        else:
+            self._shard(op["username"]).apply({key: value for key, value in op.items() if key != "username"})
+
+    @property
+    def dirty(self):
+        return self.index.dirty or any(shard.dirty for shard in self.shards.values())
+
+    def flush(self):
+        """Write out every buffered change of the index and the loaded shards."""
+        self.index.flush()
+        for shard in self.shards.values():
+            shard.flush()
+
+    def save_tasks(self, username):
+        """Fold one user's journal into their shard snapshot."""
+        self._shard(username).compact()
+
+    def compact(self):
+        self.index.compact()
+        for shard in self.shards.values():
+            shard.compact()
+
+    def _shard(self, username):
+        shard = self.shards.get(username)
+        if shard is None:
+            shard_path = os.path.join(self.base_dir, self._account_shard(username) or self._shard_name(username))
+            os.makedirs(os.path.dirname(shard_path), exist_ok=True)
+            shard = JournalStore(shard_path, apply=apply_task_op, empty=_empty_shard, autoflush=self.autoflush)
+            shard.load()
+            compact_tasks(shard.doc["tasks"])  # Slotted records instead of one dict per task
+            self.shards[username] = shard
+        return shard
+
+    def _account_shard(self, username):
+        account = self.by_username.get(username)
+        return account.get("shard") if account else None
+
+    def _shard_name(self, username):
+        # Hashed so any username maps to a safe, case-distinct file name
+        digest = hashlib.sha1(username.encode("utf-8")).hexdigest()
+        return os.path.relpath(os.path.join(self.shard_dir, digest + ".json"), self.base_dir)
+
+    def _remove_shard_files(self, shard):
+        shard_path = os.path.join(self.base_dir, shard)
+        for path in (shard_path, shard_path + ".journal"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _migrate(self, accounts):
+        os.makedirs(self.shard_dir, exist_ok=True)
+        for account in accounts["accounts"]:
+            account["shard"] = self._shard_name(account["username"])
+            shard_path = os.path.join(self.base_dir, account["shard"])
+            atomic_write_json(shard_path, {"tasks": account.pop("tasks", [])}, indent=4)
+            if os.path.exists(shard_path + ".journal"):
+                os.remove(shard_path + ".journal")
+        accounts["format"] = FORMAT_VERSION
+        self.index.compact()
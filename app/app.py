@@ -2,9 +2,16 @@ import tkinter as tk
 from tkinter import messagebox
 from tkinter import ttk
 from tkinter import simpledialog
-import json
-import bcrypt
-import os
+import json_transfer
+from accountstore import ShardedAccountStore
+from writebehind import WriteBehindSaver
+from listview import TaskListView
+from passwords import hash_password, check_password
+from taskservice import TaskService, JsonBackend
+import tracing
+
+# Search-as-you-type waits for a pause in typing this long
+SEARCH_DELAY_MS = 150
 
 class TodoAppGUI:
     def __init__(self, root, accounts_file="accounts.json"):
@@ -20,6 +27,12 @@ class TodoAppGUI:
         # Load accounts from JSON file
         self.accounts = self.load_accounts(self.accounts_file)
 
+        # Changes are written behind the UI in coalesced batches; flush them on exit
+        self.saver = WriteBehindSaver(self.root, self.store.flush)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        # F12 writes the trace (TODO_TRACE=1) and profile (TODO_PROFILE=...) collected so far
+        self.root.bind_all("<F12>", lambda event: tracing.dump())
+
         # Create a login window
         self.login_window = tk.Toplevel(root)
         self.login_window.title("Login")
@@ -38,20 +51,22 @@ class TodoAppGUI:
         ttk.Button(self.login_window, text="Create Account", style="Login.TButton", command=self.create_account_window).pack(pady=5, padx=10)
 
     def load_accounts(self, filename):
-        if os.path.exists(filename) and os.path.getsize(filename) > 0:
-            try:
-                with open(filename, "r") as json_file:
-                    return json.load(json_file)
-            except FileNotFoundError:
-                return {"accounts": []}
-            except json.decoder.JSONDecodeError:
-                return {"accounts": []}
-        else:
-            return {"accounts": []}
+        # Small account index plus one journaled task shard per user, read lazily
+        self.store = ShardedAccountStore(filename, autoflush=False)
+        return self.store.load()
 
     def save_accounts(self, filename):
-        with open(filename, "w") as json_file:
-            json.dump(self.accounts, json_file, indent=4)
+        # Fold the journal into a fresh snapshot of every account
+        self.store.compact()
+
+    def persist(self, op):
+        # Applied in memory now, written to disk by the write-behind saver
+        self.store.apply(op)
+        self.saver.mark_dirty()
+
+    def close(self):
+        self.saver.flush()
+        self.root.destroy()
 
     def login(self, username=None, password=None):
         # If username and password are not provided, use the GUI elements
@@ -68,14 +83,15 @@ class TodoAppGUI:
             messagebox.showerror("Login Failed", "Incorrect username or password.")
 
     def authenticate(self, username, password):
-        # Check if the provided username and password match any account
-        for account in self.accounts["accounts"]:
-            if account["username"] == username:
-                stored_password_hash = account["password_hash"].encode('utf-8')
-                entered_password = password.encode('utf-8')
-                if bcrypt.checkpw(entered_password, stored_password_hash):
-                    return True
-                break
+        # Look the account up by name, then do a single bcrypt check
+        account = self.store.account(username)
+        if account is not None:
+            with tracing.span("auth.bcrypt", username=username):
+                matches, new_hash = check_password(password, account["password_hash"])
+            if new_hash is not None:
+                # Stored with an outdated cost; upgrade it now that we know the password
+                self.persist({"op": "set_password_hash", "username": username, "password_hash": new_hash.decode('utf-8')})
+            return matches
         return False
 
     def create_account_window(self):
@@ -102,23 +118,19 @@ class TodoAppGUI:
                 command=lambda: self.delete_account(username_entry.get(), password_entry.get())).pack(pady=5, padx=10)
 
     def create_account(self, username, password):
-        for account in self.accounts["accounts"]:
-            if account["username"] == username:
-                messagebox.showerror("Error", "Username already exists.")
-                return
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-        self.accounts["accounts"].append({"username": username, "password_hash": hashed_password, "tasks": []})
-        self.save_accounts(self.accounts_file)
+        if self.store.account(username) is not None:
+            messagebox.showerror("Error", "Username already exists.")
+            return
+        hashed_password = hash_password(password).decode('utf-8')
+        self.persist({"op": "create_account", "username": username, "password_hash": hashed_password})
         messagebox.showinfo("Success", "Account created successfully.")
         self.create_account_window.destroy()  # Close the login window
 
     def delete_account(self, username, password):
-        for i, account in enumerate(self.accounts["accounts"]):
-            if self.authenticate(account["username"], password):
-                del self.accounts["accounts"][i]
-                self.save_accounts(self.accounts_file)
-                messagebox.showinfo("Success", "Account deleted successfully.")
-                return True
+        if self.authenticate(username, password):
+            self.persist({"op": "delete_account", "username": username})
+            messagebox.showinfo("Success", "Account deleted successfully.")
+            return True
         messagebox.showinfo("Error", "Couldn't find account or password")
         return False
 
@@ -132,6 +144,8 @@ class TodoAppGUI:
         
         # Adding search field and filter button
         self.search_var = tk.StringVar()
+        self.filter_after_id = None
+        self.search_var.trace_add("write", self.schedule_filter)
         search_entry = tk.Entry(self.root, textvariable=self.search_var, font=("Arial", 12))
         search_entry.pack(pady=5)
         filter_button = ttk.Button(self.root, text="Filter", command=self.filter_tasks)
@@ -145,8 +159,10 @@ class TodoAppGUI:
         self.priority_var.set(False)
         tk.Checkbutton(self.root, text="Priority", variable=self.priority_var, font=("Arial", 12), command=self.update_task_list).pack(pady=5, padx=10)
 
-        self.task_listbox = tk.Listbox(self.root, font=("Arial", 12))
+        # Shift/Ctrl-click selects many tasks; complete, priority and delete act on all of them
+        self.task_listbox = tk.Listbox(self.root, font=("Arial", 12), selectmode=tk.EXTENDED)
         self.task_listbox.pack(pady=5, padx=50, fill='both', expand=1)
+        self.task_view = TaskListView(self.task_listbox)
 
         self.edit_button = ttk.Button(self.root, text="Edit Selected Task", style="Add.TButton", command=self.edit_task)
         self.edit_button.pack(pady=5, padx=10)
@@ -154,6 +170,10 @@ class TodoAppGUI:
         ttk.Style().configure("Complete.TButton", font=("Arial", 12))
         self.complete_button = ttk.Button(self.root, text="Complete Selected Task", style="Complete.TButton", command=self.complete_task)
         self.complete_button.pack(pady=5, padx=10)
+        self.uncomplete_button = ttk.Button(self.root, text="Mark Selected Pending", style="Complete.TButton", command=self.uncomplete_task)
+        self.uncomplete_button.pack(pady=5, padx=10)
+        self.priority_button = ttk.Button(self.root, text="Toggle Priority", style="Complete.TButton", command=self.toggle_priority)
+        self.priority_button.pack(pady=5, padx=10)
 
         ttk.Style().configure("Delete.TButton", font=("Arial", 12))  # Configure style for delete button
         self.delete_button = ttk.Button(self.root, text="Delete Task", style="Delete.TButton", command=self.delete_task)
@@ -163,90 +183,123 @@ class TodoAppGUI:
 
     def load_tasks(self):
         # Load tasks for the specific user
-        for account in self.accounts["accounts"]:
-            if account["username"] == self.username:
-                self.tasks = account.get("tasks", [])
-                break
+        if self.store.account(self.username) is not None:
+            # Task changes go through the service into the shared store; the saver writes them
+            self.service = TaskService(JsonBackend(store=self.store, autoflush=False), self.username)
+            self.tasks = self.store.tasks(self.username)  # Shared with the store, which mutates it in place
+            # Built once per login and kept current by the backend; imports add to it here
+            self.search_index = self.service.backend.search_index(self.username)
+
+    def schedule_filter(self, *args):
+        # Search as you type, once typing pauses
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.root.after(SEARCH_DELAY_MS, self.run_scheduled_filter)
+
+    def run_scheduled_filter(self):
+        self.filter_after_id = None
+        self.filter_tasks()
 
     def filter_tasks(self):
-        keyword = self.search_var.get().lower()
+        keyword = self.search_var.get()
         if keyword:
-            # Apply filtering only if there is a keyword
-            filtered_tasks = [task for task in self.tasks if keyword in task["task"].lower()]
+            # Apply filtering only if there is a keyword; the index narrows it down to the matches
+            matches = self.search_index.search(keyword)
+            filtered_tasks = [task for task in self.tasks if task.uid in matches]
             self.update_task_list(filtered_tasks)
         else:
             # If the keyword is empty, show all tasks
             self.update_task_list(self.tasks)
 
     def save_tasks(self):
-        # Save tasks for the specific user
-        for account in self.accounts["accounts"]:
-            if account["username"] == self.username:
-                account["tasks"] = self.tasks
-                break
-        self.save_accounts(self.accounts_file)
+        # Bulk changes to self.tasks are persisted by rewriting only this user's shard
+        self.store.save_tasks(self.username)
+
+    def import_tasks(self, path):
+        # Stream tasks from a .csv/.jsonl file, then save and redraw once
+        count = json_transfer.import_tasks(self.tasks, json_transfer.read_tasks(path))
+        for task in self.tasks[len(self.tasks) - count:]:
+            self.search_index.add(task.uid, task["task"])
+        self.save_tasks()
+        self.update_task_list()
+        return count
+
+    def export_tasks(self, path):
+        return json_transfer.write_tasks(path, self.tasks)
 
     def add_task(self, task=None):
         if task is None:
             task = self.task_entry.get()
         if task:
             priority = self.priority_var.get()
-            self.tasks.append({"task": task, "priority": priority, "finished": False})  # Add task with finished status
-            self.save_tasks()  # Save tasks
+            self.service.add(task, priority)  # Added with finished status False
+            self.saver.mark_dirty()
             self.update_task_list()
             self.task_entry.delete(0, tk.END)
 
+    def selected_indexes(self):
+        """Positions in self.tasks of the selected rows, which may be filtered."""
+        keys = set(self.task_view.selected_keys())
+        return [index for index, task in enumerate(self.tasks) if task.uid in keys]
+
     def edit_task(self, new_task=None):
-        selected_index = self.task_listbox.curselection()
-        if selected_index is not None and len(selected_index) > 0:
-            index = selected_index[0]
+        selected_indexes = self.selected_indexes()
+        if selected_indexes:
+            index = selected_indexes[0]
             old_task = self.tasks[index]["task"]
             old_priority = self.tasks[index]["priority"]
             new_task = simpledialog.askstring("Edit Task", "New Task:", initialvalue=old_task)
             if new_task is not None:
                 new_priority = messagebox.askyesno("Edit Priority", "Set task priority?")
-                self.tasks[index]["task"] = new_task
-                self.tasks[index]["priority"] = new_priority
-                self.save_tasks()  # Save tasks
+                self.service.edit(index, new_task, new_priority)
+                self.saver.mark_dirty()
                 self.update_task_list()
         else:
             raise ValueError("No task selected for editing")
 
     def update_task_list(self, tasks=None):
-        self.task_listbox.delete(0, tk.END)  # Clear existing tasks in the listbox
         if tasks is None:
             tasks = self.tasks  # If no tasks are provided, use all tasks
-        for task in tasks:
-            task_text = task["task"] + (" [Priority]" if task["priority"] else "") + (" [Finished]" if task["finished"] else "")
-            self.task_listbox.insert(tk.END, task_text)
-            if task["priority"]:
-                self.task_listbox.itemconfig(tk.END, bg="red")  # Highlight priority tasks
-
-    def complete_task(self):
-        selected_index = self.task_listbox.curselection()
-        if selected_index:
-            index = selected_index[0]
-            self.tasks[index]["finished"] = True  # Mark task as finished
-            
-            # Save the updated task list for the current user
-            for account in self.accounts["accounts"]:
-                if account["username"] == self.username:
-                    account["tasks"] = self.tasks
-                    break
-            self.save_accounts(self.accounts_file)  # Persist changes
-            
+        # Only rows that differ from what is shown get redrawn; priority tasks are highlighted
+        with tracing.span("render.task_list") as render:
+            rows = [(task.uid,
+                     task["task"] + (" [Priority]" if task["priority"] else "") + (" [Finished]" if task["finished"] else ""),
+                     "red" if task["priority"] else None)
+                    for task in tasks]
+            self.task_view.set_rows(rows)
+            render.set(rows=len(rows))
+
+    def complete_task(self, finished=True):
+        selected_indexes = self.selected_indexes()
+        if selected_indexes:
+            # One batch for the whole selection, written by one flush and drawn by one refresh
+            self.service.complete_many(selected_indexes, finished)
+            self.saver.mark_dirty()
+
             self.update_task_list()  # Reflect changes in the UI
-            return index  # For testing purposes
+            return selected_indexes[0]  # For testing purposes
         return None
 
+    def uncomplete_task(self):
+        return self.complete_task(finished=False)
+
+    def toggle_priority(self):
+        # Lowers the priority when every selected task has it, otherwise raises it
+        selected_indexes = self.selected_indexes()
+        if selected_indexes:
+            priority = not all(self.tasks[index]["priority"] for index in selected_indexes)
+            self.service.prioritize_many(selected_indexes, priority)
+            self.saver.mark_dirty()
+            self.update_task_list()
+        return selected_indexes
+
     def delete_task(self):
-        selected_index = self.task_listbox.curselection()
-        if selected_index:
-            index = selected_index[0]
-            del self.tasks[index]  # Remove the selected task from the list
+        selected_indexes = self.selected_indexes()
+        if selected_indexes:
+            self.service.delete_many(selected_indexes)  # Remove the selected tasks
+            self.saver.mark_dirty()
             self.update_task_list()  # Update the task listbox display
-            self.save_tasks()  # Save the updated tasks to the file
-            return index  # Return the index of the deleted task
+            return selected_indexes[0]  # Return the index of the first deleted task
         return None
 
 
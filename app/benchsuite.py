@@ -0,0 +1,233 @@
+"""Benchmark suite for the three task stores.
+
+    python benchsuite.py run [--backends json sqlite encrypted] [--sizes 10 1000 100000 1000000]
+                             [--output results.json] [--baseline bench_baseline.json]
+
+For every backend and size, a fresh store is seeded with that many tasks
+spread over --users accounts. The suite then times login, first load, add,
+complete, edit, delete, filter and account deletion for one of those users.
+add, complete, edit and delete are the mean of --ops single calls;
+complete_many and delete_many act on --ops tasks in one batch, as a
+multi-selection in the GUIs does, and the report shows their speedup.
+Each case runs in its own process, so its peak RSS is its own. Every phase
+records wall time, the process's peak RSS after the phase, and the bytes it
+wrote.
+
+With --baseline, every timing is compared against the stored results. A
+phase that got slower than --tolerance times its baseline, and by more than
+--min-delta-ms, is reported and the run exits with status 1.
+
+Timings only compare on the machine that recorded them, so the baseline is
+not kept in the repository. Record one on your machine before a change:
+
+    python benchsuite.py run --save-baseline bench_baseline.json
+
+and compare with --baseline bench_baseline.json after it.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import passwords
+from taskservice import TaskService, JsonBackend, SqliteBackend, EncryptedBackend
+
+BACKENDS = {"json": JsonBackend, "sqlite": SqliteBackend, "encrypted": EncryptedBackend}
+STORE_FILES = {"json": "accounts.json", "sqlite": "todo_app.db", "encrypted": "todo_app.db"}
+DEFAULT_SIZES = [10, 1000, 100000, 1000000]
+PHASES = ["seed", "login", "first_load", "add", "complete", "edit", "delete", "complete_many", "delete_many", "filter",
+          "delete_account"]
+# Accounts other than the measured one are hashed at the lowest cost so seeding stays quick
+SEED_ROUNDS = 4
+USER = "user0"
+PASSWORD = "benchmark password"
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:  # Unix only
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # bytes on macOS, KiB elsewhere
+
+def bytes_written():
+    # Bytes this process handed to write(); Linux only
+    try:
+        with open("/proc/self/io") as io:
+            for line in io:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+class Recorder:
+    def __init__(self):
+        self.metrics = {}
+
+    def measure(self, phase, func, repeat=1):
+        """Run func repeat times and record the mean wall time of one call under phase."""
+        written = bytes_written()
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        after = bytes_written()
+        self.metrics[phase] = {
+            "ms": elapsed / repeat,
+            "peak_rss_kb": peak_rss_kb(),
+            "bytes_written": after - written if after is not None and written is not None else None,
+        }
+        return result
+
+def seed(backend, tasks, users, rounds):
+    counts = [tasks // users + (1 if i < tasks % users else 0) for i in range(users)]
+    for i, count in enumerate(counts):
+        username = "user%d" % i
+        passwords.BCRYPT_ROUNDS = rounds if username == USER else SEED_ROUNDS
+        backend.create_account(username, PASSWORD)
+        backend.authenticate(username, PASSWORD)
+        backend.add_many(username, [("Task %d of %s: review the quarterly report" % (n, username), n % 5 == 0, n % 3 == 0)
+                                    for n in range(count)])
+    passwords.BCRYPT_ROUNDS = rounds
+
+def run_case(backend_name, tasks, users, ops, rounds, workdir):
+    """Seed one store and time every phase; returns {phase: metrics}."""
+    path = os.path.join(workdir, STORE_FILES[backend_name])
+    backend_class = BACKENDS[backend_name]
+    recorder = Recorder()
+    backend = backend_class(path)
+    recorder.measure("seed", lambda: seed(backend, tasks, max(1, min(users, tasks)), rounds))
+    backend.close()
+
+    # A fresh backend, as after starting the app
+    backend = recorder.measure("login", lambda: _open_and_login(backend_class, path))
+    service = TaskService(backend, USER)
+    recorder.measure("first_load", service.tasks)
+    new_ids = []
+    recorder.measure("add", lambda: new_ids.append(service.add("Benchmark task")), repeat=ops)
+    ids = iter(new_ids)
+    recorder.measure("complete", lambda: service.complete(next(ids)), repeat=ops)
+    ids = iter(new_ids)
+    recorder.measure("edit", lambda: service.edit(next(ids), "Edited benchmark task", True), repeat=ops)
+    # The search each GUI filters with; for JSON the first call builds the trigram index, as login does in app.py
+    recorder.measure("filter", lambda: service.search("quarterly"), repeat=max(1, ops // 10))
+    # Newest first, so the JSON backend's positions of the remaining ones do not move
+    ids = iter(reversed(new_ids))
+    recorder.measure("delete", lambda: service.delete(next(ids)), repeat=ops)
+    # The same number of tasks at once: one transaction or journal write per call
+    new_ids = service.add_many([("Benchmark task", False, False)] * ops)
+    recorder.measure("complete_many", lambda: service.complete_many(new_ids))
+    recorder.measure("delete_many", lambda: service.delete_many(new_ids))
+    recorder.measure("delete_account", service.delete_account)
+    backend.close()
+    return recorder.metrics
+
+def _open_and_login(backend_class, path):
+    backend = backend_class(path)
+    if not backend.authenticate(USER, PASSWORD):
+        raise RuntimeError("benchmark login failed")
+    return backend
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Return a line for every phase that got slower than its baseline allows."""
+    previous = {(case["backend"], case["tasks"]): case["metrics"] for case in baseline["results"]}
+    regressions = []
+    for case in results["results"]:
+        before = previous.get((case["backend"], case["tasks"]))
+        if before is None:
+            continue
+        for phase, metrics in case["metrics"].items():
+            if phase not in before:
+                continue
+            old_ms, new_ms = before[phase]["ms"], metrics["ms"]
+            if new_ms > old_ms * tolerance and new_ms - old_ms > min_delta_ms:
+                regressions.append(f"{case['backend']} {case['tasks']} tasks {phase}: {old_ms:.2f} ms -> {new_ms:.2f} ms")
+    return regressions
+
+def _print_table(results):
+    print(f"{'backend':<10} {'tasks':>8} " + " ".join(f"{phase:>14}" for phase in PHASES))
+    for case in results["results"]:
+        print(f"{case['backend']:<10} {case['tasks']:>8} " +
+              " ".join(f"{case['metrics'][phase]['ms']:>11.2f} ms" for phase in PHASES))
+
+def _print_bulk_speedup(results, ops):
+    print(f"\nOne batch of {ops} tasks against {ops} single calls:")
+    for case in results["results"]:
+        metrics = case["metrics"]
+        speedups = [f"{single} {metrics[single]['ms'] * ops / max(metrics[bulk]['ms'], 1e-6):.1f}x"
+                    for single, bulk in (("complete", "complete_many"), ("delete", "delete_many"))]
+        print(f"{case['backend']:<10} {case['tasks']:>8} " + "  ".join(speedups))
+
+def run(args):
+    results = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "bcrypt_rounds": args.bcrypt_rounds, "users": args.users, "ops": args.ops,
+                 "started": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": [],
+    }
+    for tasks in args.sizes:
+        for backend_name in args.backends:
+            # A child process per case keeps peak RSS and caches separate
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), "case", backend_name, str(tasks),
+                                    "--users", str(args.users), "--ops", str(args.ops),
+                                    "--bcrypt-rounds", str(args.bcrypt_rounds)],
+                                   check=True, stdout=subprocess.PIPE, text=True)
+            results["results"].append({"backend": backend_name, "tasks": tasks, "metrics": json.loads(child.stdout)})
+            print(f"done: {backend_name} with {tasks} tasks", file=sys.stderr)
+    _print_table(results)
+    _print_bulk_speedup(results, args.ops)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("REGRESSIONS against " + args.baseline + ":", file=sys.stderr)
+            for line in regressions:
+                print("  " + line, file=sys.stderr)
+            sys.exit(1)
+        print("No regressions against " + args.baseline + ".", file=sys.stderr)
+
+def case(args):
+    with tempfile.TemporaryDirectory() as workdir:
+        metrics = run_case(args.backend, args.tasks, args.users, args.ops, args.bcrypt_rounds, workdir)
+    print(json.dumps(metrics))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run every backend and size and report")
+    run_parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    run_parser.add_argument("--output", help="write the results as JSON")
+    run_parser.add_argument("--baseline", help="fail on regressions against this results file")
+    run_parser.add_argument("--save-baseline", help="also write the results here as the new baseline")
+    run_parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown factor")
+    run_parser.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    run_parser.set_defaults(func=run)
+
+    case_parser = commands.add_parser("case", help="run one backend and size and print its metrics as JSON")
+    case_parser.add_argument("backend", choices=list(BACKENDS))
+    case_parser.add_argument("tasks", type=int)
+    case_parser.set_defaults(func=case)
+
+    for subparser in (run_parser, case_parser):
+        subparser.add_argument("--users", type=int, default=20)
+        subparser.add_argument("--ops", type=int, default=50, help="single operations timed per phase")
+        subparser.add_argument("--bcrypt-rounds", type=int, default=passwords.BCRYPT_ROUNDS,
+                               help="cost of the measured user's password")
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Snapshot plus append-only journal persistence for accounts.json.
+
+Every mutation is appended to `<accounts file>.journal` as one small JSON line
+instead of rewriting the whole accounts file. On startup the journal is replayed
+on top of the snapshot, and once it grows past a threshold it is folded back
+into a fresh snapshot.
+
+The snapshot and the journal both carry a generation number. Compaction writes
+the snapshot first (atomically) and then starts a new journal, so a crash in
+between leaves a journal whose generation no longer matches; it is then
+discarded because the snapshot already contains it.
+"""
+import json
+import os
+import tracing
+from taskmodel import TaskRecord, json_default
+
+# Bytes of journal after which it is folded into the snapshot
+COMPACT_THRESHOLD = 1024 * 1024
+
+def _find_account(accounts, username):
+    for account in accounts["accounts"]:
+        if account["username"] == username:
+            return account
+    return None
+
+def apply_task_op(doc, op):
+    """Apply one task record to a document holding a "tasks" list (an account or a shard)."""
+    kind = op["op"]
+    tasks = doc.setdefault("tasks", [])
+    if kind == "add_task":
+        tasks.append(TaskRecord.from_dict(op["task"]))
+    elif kind == "update_task" and op["index"] < len(tasks):
+        tasks[op["index"]].update(op["fields"])
+    elif kind == "delete_task" and op["index"] < len(tasks):
+        del tasks[op["index"]]
+    elif kind == "set_tasks":
+        tasks[:] = [TaskRecord.from_dict(task) for task in op["tasks"]]
+
+def apply_op(accounts, op):
+    """Apply one journal record to the in-memory accounts document."""
+    kind = op["op"]
+    if kind == "create_account":
+        account = {"username": op["username"], "password_hash": op["password_hash"]}
+        account.update({key: value for key, value in op.items() if key not in ("op", "username", "password_hash")})
+        if "shard" not in account:
+            account["tasks"] = []
+        accounts["accounts"].append(account)
+    elif kind == "delete_account":
+        accounts["accounts"] = [a for a in accounts["accounts"] if a["username"] != op["username"]]
+    elif kind == "set_password_hash":
+        account = _find_account(accounts, op["username"])
+        if account is not None:
+            account["password_hash"] = op["password_hash"]
+    else:
+        account = _find_account(accounts, op["username"])
+        if account is None:
+            return  # The snapshot was replaced underneath the journal; skip what no longer applies
+        apply_task_op(account, op)
+
+def atomic_write(path, write):
+    """Call write(file) on a temp file, fsync it and rename it over path."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def atomic_write_json(path, data, **kwargs):
+    with tracing.span("json.dump", path=os.path.basename(path)):
+        atomic_write(path, lambda f: json.dump(data, f, default=json_default, **kwargs))
+    if tracing.enabled():
+        tracing.count("json.snapshot_bytes", os.path.getsize(path))
+
+class JournalStore:
+    """
+    One JSON document persisted as a snapshot plus journal. By default the
+    document is the accounts file; pass apply/empty for other layouts.
+
+    With autoflush off, records are only buffered by apply() and reach the
+    disk, in one write and fsync, when flush() is called.
+    """
+
+    def __init__(self, path, compact_threshold=COMPACT_THRESHOLD, apply=apply_op, empty=lambda: {"accounts": []},
+                 autoflush=True):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.compact_threshold = compact_threshold
+        self.apply_op = apply
+        self.empty = empty
+        self.autoflush = autoflush
+        self.doc = empty()
+        self.journal_size = 0
+        self.pending = []
+
+    def load(self):
+        """Read the snapshot, replay the journal on top of it and return the document."""
+        with tracing.span("json.load", path=os.path.basename(self.path)):
+            self.doc = self._read_snapshot()
+        if not self._replay():
+            self._start_journal()
+        return self.doc
+
+    def apply(self, op):
+        """Apply a mutation in memory and queue it for the journal."""
+        self.apply_op(self.doc, op)
+        self.pending.append((json.dumps(op, default=json_default) + "\n").encode("utf-8"))
+        if self.autoflush:
+            self.flush()
+
+    @property
+    def dirty(self):
+        return bool(self.pending)
+
+    def flush(self):
+        """Append every queued record in one write, fsync, and compact if the journal grew too big."""
+        if not self.pending:
+            return
+        data = b"".join(self.pending)
+        with tracing.span("journal.flush", records=len(self.pending), bytes=len(data)):
+            with open(self.journal_path, "ab") as journal:
+                journal.write(data)
+                journal.flush()
+                os.fsync(journal.fileno())
+        tracing.count("journal.bytes", len(data))
+        self.pending = []
+        self.journal_size += len(data)
+        if self.journal_size > self.compact_threshold:
+            self.compact()
+
+    def compact(self):
+        """Fold the journal into a new snapshot and start an empty journal."""
+        self.pending = []  # Already applied to the document being written
+        self.doc["generation"] = self.doc.get("generation", 0) + 1
+        atomic_write_json(self.path, self.doc, indent=4)
+        self._start_journal()
+
+    def _read_snapshot(self):
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            try:
+                with open(self.path, "r") as json_file:
+                    return json.load(json_file)
+            except (FileNotFoundError, json.decoder.JSONDecodeError):
+                pass
+        return self.empty()
+
+    def _replay(self):
+        # Returns False when there is no usable journal for this snapshot
+        try:
+            journal = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return False
+        with journal:
+            try:
+                header = json.loads(journal.readline())
+            except ValueError:
+                return False
+            if header.get("generation") != self.doc.get("generation", 0):
+                return False
+            good_size = journal.tell()
+            for line in journal:
+                if not line.endswith(b"\n"):
+                    break  # Torn last record from a crash mid-append
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    break
+                self.apply_op(self.doc, op)
+                good_size += len(line)
+        if good_size != os.path.getsize(self.journal_path):
+            os.truncate(self.journal_path, good_size)
+        self.journal_size = good_size
+        return True
+
+    def _start_journal(self):
+        header = json.dumps({"generation": self.doc.get("generation", 0)}) + "\n"
+        atomic_write(self.journal_path, lambda f: f.write(header))
+        self.journal_size = os.path.getsize(self.journal_path)
@@ -0,0 +1,84 @@
+"""Bulk import and export of tasks between accounts.json and CSV or JSON Lines.
+
+    python json_transfer.py import USERNAME tasks.csv [--accounts accounts.json]
+    python json_transfer.py export USERNAME tasks.jsonl [--accounts accounts.json]
+"""
+import argparse
+import csv
+import json
+import sys
+from accountstore import ShardedAccountStore
+from taskmodel import TaskRecord
+
+FIELDS = ("task", "priority", "finished")
+PROGRESS_EVERY = 10000
+
+def _flag(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "y")
+    return bool(value)
+
+def read_tasks(path):
+    """Yield task dicts from a .csv or .jsonl file, one at a time."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for row in rows:
+            yield {"task": row["task"], "priority": _flag(row.get("priority")), "finished": _flag(row.get("finished"))}
+
+def write_tasks(path, tasks):
+    """Write task dicts to a .csv or .jsonl file, one at a time."""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for task in tasks:
+                writer.writerow((task["task"], int(task["priority"]), int(task["finished"])))
+                count += 1
+        else:
+            for task in tasks:
+                f.write(json.dumps({field: task[field] for field in FIELDS}) + "\n")
+                count += 1
+    return count
+
+def import_tasks(task_list, tasks, progress=None):
+    """Append a stream of tasks to a user's task list; the caller saves once afterwards."""
+    count = 0
+    for task in tasks:
+        task_list.append(TaskRecord.from_dict(task))
+        count += 1
+        if progress and count % PROGRESS_EVERY == 0:
+            progress(count)
+    if progress:
+        progress(count)
+    return count
+
+def _print_progress(count):
+    print(f"\r{count} tasks", end="", file=sys.stderr, flush=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("username")
+    parser.add_argument("path", help="a .csv or .jsonl file")
+    parser.add_argument("--accounts", default="accounts.json")
+    args = parser.parse_args()
+
+    store = ShardedAccountStore(args.accounts)
+    store.load()
+    if store.account(args.username) is None:
+        sys.exit(f"No account named {args.username!r}.")
+    tasks = store.tasks(args.username)
+    if args.action == "import":
+        count = import_tasks(tasks, read_tasks(args.path), _print_progress)
+        print(file=sys.stderr)
+        store.save_tasks(args.username)  # One atomic shard write for the whole import
+        print(f"Imported {count} tasks.")
+    else:
+        print(f"Exported {write_tasks(args.path, tasks)} tasks.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Incremental, lazily filled rendering of the task list into a Tk Listbox."""
+import tkinter as tk
+
+# Rows rendered up front; more are appended as the user scrolls towards the end
+PAGE_SIZE = 200
+# Fraction of the list scrolled past after which the next page is rendered
+PREFETCH_AT = 0.9
+
+class TaskListView:
+    """
+    Keeps a Listbox in sync with a list of (key, text, background) rows.
+
+    set_rows() compares the new rows with what is on screen and only inserts,
+    deletes or rewrites the rows that changed. Only a prefix of the rows is put
+    into the Listbox; the rest follow a page at a time while scrolling. The key
+    identifies a task across updates so its selection survives a refresh.
+
+    When the rows themselves are read lazily, on_end is called once every row
+    is rendered and the user scrolls near the end; it may extend_rows().
+
+    The view follows scrolling through the Listbox's yscrollcommand. A command
+    already set there, such as a Scrollbar's, keeps receiving every update.
+    """
+
+    def __init__(self, listbox, page_size=PAGE_SIZE, on_end=None):
+        self.listbox = listbox
+        self.page_size = page_size
+        self.on_end = on_end
+        self.rows = []
+        self.rendered = 0  # self.rows[:self.rendered] is what the Listbox shows
+        self._yscrollcommand = listbox.tk.splitlist(listbox.cget("yscrollcommand"))  # Tcl command words, () if none
+        listbox.configure(yscrollcommand=self._on_scroll)
+
+    def set_rows(self, rows):
+        selected_keys = set(self.selected_keys())
+        old = self.rows[:self.rendered]
+        rendered = min(len(rows), max(self.rendered, self.page_size))
+        self._apply_diff(old, rows[:rendered])
+        self.rows = rows
+        self.rendered = rendered
+        if selected_keys:
+            self._restore_selection(selected_keys)
+
+    def extend_rows(self, rows):
+        """Append rows after the current ones without comparing the rest."""
+        self.rows = self.rows + rows
+
+    def ensure_rendered(self, count):
+        """Render at least the first count rows."""
+        count = min(count, len(self.rows))
+        if count > self.rendered:
+            self._insert(self.rendered, self.rows[self.rendered:count])
+            self.rendered = count
+
+    def key_at(self, index):
+        return self.rows[index][0]
+
+    def selected_keys(self):
+        """Keys of the selected rows, top to bottom."""
+        return [self.rows[i][0] for i in self.listbox.curselection() if i < len(self.rows)]
+
+    def _on_scroll(self, first, last):
+        if self._yscrollcommand:
+            self.listbox.tk.call(*self._yscrollcommand, first, last)
+        if float(last) < PREFETCH_AT:
+            return
+        if self.rendered == len(self.rows) and self.on_end is not None:
+            self.on_end()
+        if self.rendered < len(self.rows):
+            self.ensure_rendered(self.rendered + self.page_size)
+
+    def _apply_diff(self, old, new):
+        # Skip the unchanged head and tail; only the middle is touched
+        prefix = 0
+        limit = min(len(old), len(new))
+        while prefix < limit and old[prefix] == new[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+            suffix += 1
+        old_middle = old[prefix:len(old) - suffix]
+        new_middle = new[prefix:len(new) - suffix]
+        common = min(len(old_middle), len(new_middle))
+        for offset in range(common):
+            if old_middle[offset] != new_middle[offset]:
+                index = prefix + offset
+                self.listbox.delete(index)
+                self._insert(index, [new_middle[offset]])
+        if len(old_middle) > common:
+            self.listbox.delete(prefix + common, prefix + len(old_middle) - 1)
+        elif len(new_middle) > common:
+            self._insert(prefix + common, new_middle[common:])
+
+    def _insert(self, index, rows):
+        self.listbox.insert(index, *[row[1] for row in rows])
+        for offset, row in enumerate(rows):
+            if row[2]:
+                self.listbox.itemconfig(index + offset, bg=row[2])
+
+    def _restore_selection(self, keys):
+        self.listbox.selection_clear(0, tk.END)
+        for index in range(self.rendered):
+            if self.rows[index][0] in keys:
+                self.listbox.selection_set(index)
@@ -0,0 +1,83 @@
+"""bcrypt password hashing with a configurable cost.
+
+The work factor comes from BCRYPT_ROUNDS, which the TODO_BCRYPT_ROUNDS
+environment variable overrides. Each extra round doubles the time of a login.
+Hashes made with a different cost keep working. check_password() reports them
+so the caller can store a rehash after a successful login, which lets the
+cost be raised (or lowered) over time without resetting any password.
+
+To pick a cost for this machine, measure checkpw per cost against a target
+login latency:
+
+    python passwords.py calibrate [--target-ms 250]
+"""
+import argparse
+import os
+import time
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get("TODO_BCRYPT_ROUNDS", 12))
+# Range tried by calibrate(); bcrypt itself accepts 4 to 31
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+def _as_bytes(value):
+    return value.encode("utf-8") if isinstance(value, str) else value
+
+def hash_password(password, rounds=None):
+    """Hash a password at the configured cost (or the given one)."""
+    return bcrypt.hashpw(_as_bytes(password), bcrypt.gensalt(rounds or BCRYPT_ROUNDS))
+
+def hash_rounds(password_hash):
+    """The cost a bcrypt hash was made with ($2b$<rounds>$...)."""
+    return int(_as_bytes(password_hash).split(b"$")[2])
+
+def check_password(password, password_hash):
+    """
+    Return (matches, new_hash). new_hash is a fresh hash at the configured
+    cost when the password matches a hash made with a different cost, else None.
+    """
+    if not bcrypt.checkpw(_as_bytes(password), _as_bytes(password_hash)):
+        return False, None
+    if hash_rounds(password_hash) != BCRYPT_ROUNDS:
+        return True, hash_password(password)
+    return True, None
+
+def calibrate(target_ms, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS):
+    """
+    Time checkpw at each cost from min_rounds up and return ([(rounds, ms)],
+    best), where best is the highest cost whose check stays within target_ms
+    (never below min_rounds). Stops at the first cost over the target, since every higher one is slower.
+    """
+    timings = []
+    best = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        password_hash = hash_password(b"calibration", rounds)
+        start = time.perf_counter()
+        bcrypt.checkpw(b"calibration", password_hash)
+        elapsed = (time.perf_counter() - start) * 1000
+        timings.append((rounds, elapsed))
+        if elapsed > target_ms:
+            break
+        best = rounds
+    return timings, best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    calibrate_parser = commands.add_parser("calibrate", help="pick the bcrypt cost for a target login latency")
+    calibrate_parser.add_argument("--target-ms", type=float, default=250)
+    calibrate_parser.add_argument("--min-rounds", type=int, default=MIN_ROUNDS)
+    calibrate_parser.add_argument("--max-rounds", type=int, default=MAX_ROUNDS)
+    args = parser.parse_args()
+
+    timings, best = calibrate(args.target_ms, args.min_rounds, args.max_rounds)
+    for rounds, elapsed in timings:
+        print(f"rounds {rounds:>2}: {elapsed:8.1f} ms" + ("  <- selected" if rounds == best else ""))
+    if timings[0][1] > args.target_ms:
+        print(f"Even {args.min_rounds} rounds take longer than {args.target_ms:g} ms on this machine.")
+    print(f"Set TODO_BCRYPT_ROUNDS={best} (currently {BCRYPT_ROUNDS}); "
+          "existing hashes are upgraded on their next login.")
+
+if __name__ == "__main__":
+    main()
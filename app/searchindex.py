@@ -0,0 +1,80 @@
+"""In-memory trigram index for searching task text without scanning every task."""
+from collections import defaultdict
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+class TrigramIndex:
+    """
+    Inverted index from normalized character trigrams to task keys.
+
+    A query of three or more characters only looks at the tasks that contain
+    all of its trigrams and then confirms the match on those few candidates.
+    Shorter queries fall back to a scan of the normalized texts.
+
+    Texts and queries both go through normalize (str.lower by default); pass
+    the one another search uses when the two must find the same tasks.
+    """
+
+    def __init__(self, items=(), normalize=str.lower):
+        self.normalize = normalize
+        self.texts = {}  # key -> normalized text
+        self.postings = defaultdict(set)  # trigram -> keys
+        for key, text in items:
+            self.add(key, text)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, key, text):
+        text = self.normalize(text)
+        self.texts[key] = text
+        for gram in _trigrams(text):
+            self.postings[gram].add(key)
+
+    def remove(self, key):
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        for gram in _trigrams(text):
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def update(self, key, text):
+        self.remove(key)
+        self.add(key, text)
+
+    def search(self, query, prefix=False):
+        """
+        Return the keys whose text contains query, both normalized. With
+        prefix=True only matches at the start of a word count.
+        """
+        query = self.normalize(query)
+        if not query:
+            return set(self.texts)
+        grams = _trigrams(query)
+        if grams:
+            # Intersect the shortest posting lists first
+            candidates = None
+            for gram in sorted(grams, key=lambda gram: len(self.postings.get(gram, ()))):
+                keys = self.postings.get(gram)
+                if not keys:
+                    return set()
+                candidates = set(keys) if candidates is None else candidates & keys
+                if not candidates:
+                    return set()
+        else:
+            candidates = self.texts
+        if prefix:
+            return {key for key in candidates if _has_word_prefix(self.texts[key], query)}
+        return {key for key in candidates if query in self.texts[key]}
+
+def _has_word_prefix(text, query):
+    start = text.find(query)
+    while start != -1:
+        if start == 0 or not text[start - 1].isalnum():
+            return True
+        start = text.find(query, start + 1)
+    return False
@@ -0,0 +1,137 @@
+"""Compact in-memory tasks for the JSON store.
+
+A task loaded from JSON is a dict {"task", "priority", "finished"}, which
+costs a few hundred bytes before its text. TaskRecord keeps the same mapping
+interface (task["finished"], task.update(...), iteration, == with dicts) in a
+__slots__ object with both flags packed into one small int. Texts are interned,
+so repeated descriptions share one string. A record's uid is never reused in
+the process, unlike id() once a deleted task is freed, so app.py keys its view
+and search index by it; it is assigned on first use.
+
+To see the difference per task on this machine:
+
+    python taskmodel.py measure [--tasks 100000]
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import tracemalloc
+from collections.abc import MutableMapping
+
+FIELDS = ("task", "priority", "finished")
+_PRIORITY = 1
+_FINISHED = 2
+_uids = itertools.count(1)
+
+class TaskRecord(MutableMapping):
+    __slots__ = ("_uid", "text", "flags", "extra")
+
+    def __init__(self, task, priority=False, finished=False):
+        self._uid = None
+        self.text = sys.intern(task)
+        self.flags = (_PRIORITY if priority else 0) | (_FINISHED if finished else 0)
+        self.extra = None  # Any other keys of the original dict, kept so nothing is lost
+
+    @property
+    def uid(self):
+        if self._uid is None:
+            self._uid = next(_uids)
+        return self._uid
+
+    @classmethod
+    def from_dict(cls, task):
+        if isinstance(task, cls):
+            return task
+        record = cls(task["task"], task.get("priority", False), task.get("finished", False))
+        extra = {key: value for key, value in task.items() if key not in FIELDS}
+        if extra:
+            record.extra = extra
+        return record
+
+    def __getitem__(self, key):
+        if key == "task":
+            return self.text
+        if key == "priority":
+            return bool(self.flags & _PRIORITY)
+        if key == "finished":
+            return bool(self.flags & _FINISHED)
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "task":
+            self.text = sys.intern(value)
+        elif key in ("priority", "finished"):
+            bit = _PRIORITY if key == "priority" else _FINISHED
+            self.flags = self.flags | bit if value else self.flags & ~bit
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in FIELDS or self.extra is None or key not in self.extra:
+            raise KeyError(key)
+        del self.extra[key]
+
+    def __iter__(self):
+        yield from FIELDS
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self):
+        return len(FIELDS) + (len(self.extra) if self.extra else 0)
+
+    def __repr__(self):
+        return f"TaskRecord({dict(self)!r})"
+
+    def to_dict(self):
+        return dict(self)
+
+def compact_tasks(tasks):
+    """Replace the dicts of a task list with TaskRecords, in place."""
+    tasks[:] = [TaskRecord.from_dict(task) for task in tasks]
+    return tasks
+
+def json_default(value):
+    # json.dump() hook, so documents holding TaskRecords serialize like dicts
+    if isinstance(value, TaskRecord):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def measure(make_tasks):
+    """Bytes traced by tracemalloc while make_tasks() builds and holds its result."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        tasks = make_tasks()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del tasks
+    return size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    measure_parser = commands.add_parser("measure", help="bytes per task as dicts and as TaskRecords")
+    measure_parser.add_argument("--tasks", type=int, default=100000)
+    measure_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from workload import generate_tasks  # Imported here; workload itself loads the store, and so this module
+    # Serialized first, so both sides measure what loading a shard builds
+    data = json.dumps([{"task": text, "priority": priority, "finished": finished}
+                       for text, priority, finished in generate_tasks(random.Random(args.seed), args.tasks)])
+    as_dicts = measure(lambda: json.loads(data))
+    as_records = measure(lambda: compact_tasks(json.loads(data)))
+    texts = measure(lambda: [task["task"] for task in json.loads(data)])  # The list and the strings alone
+    print(f"{args.tasks} tasks, bytes per task including its text ({texts / args.tasks:.0f} of them list and text):")
+    print(f"  dicts       {as_dicts / args.tasks:>6.0f}  ({(as_dicts - texts) / args.tasks:.0f} per task besides the text)")
+    print(f"  TaskRecords {as_records / args.tasks:>6.0f}  ({(as_records - texts) / args.tasks:.0f} per task besides the text)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""GUI-free task API over the three storage formats.
+
+    service = TaskService.login(JsonBackend("accounts.json"), "bob", "secret")
+    ids = service.add_many([("Buy milk", True, False), ("Call Bob", False, False)])
+    service.complete_many(ids)
+
+A backend stores accounts and tasks in one format:
+- JsonBackend: the sharded, journaled accounts.json of app.py,
+- SqliteBackend: the plain SQLite database of tests/test_app.py,
+- EncryptedBackend: the encrypted database of tests/baba.
+TaskService binds a backend to one logged-in user. Every batch operation
+reaches the backend as one call, which is one transaction for the SQLite
+backends and one journal write for JSON.
+
+Tasks come back as Task(id, text, priority, finished). The JSON format has no
+task ids, so JsonBackend uses list positions. A delete shifts the positions
+of later tasks, so re-read tasks() after delete_many.
+"""
+import importlib.util
+import os
+import sqlite3
+import sys
+from collections import namedtuple
+from accountstore import ShardedAccountStore
+from passwords import hash_password, check_password
+from searchindex import TrigramIndex
+
+Task = namedtuple("Task", "id text priority finished")
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+SQLITE_APP_DIR = os.path.join(_HERE, "tests")
+ENCRYPTED_APP_DIR = os.path.join(_HERE, "tests", "baba")
+
+_app_modules = {}  # (directory, name) -> module loaded by import_app_module
+
+def import_app_module(directory, name):
+    """
+    Load a module of one of the SQLite apps, once. They are standalone programs
+    with flat imports whose module names could clash with each other's or the
+    standard library's, so nothing is added to sys.path for good: the module is
+    loaded from its file as "<directory name>_<name>", with its directory on
+    sys.path only while it runs, and the sibling modules it imported on the way
+    are renamed the same way.
+    """
+    directory = os.path.abspath(directory)
+    if (directory, name) in _app_modules:
+        return _app_modules[directory, name]
+    prefix = os.path.basename(directory)
+    spec = importlib.util.spec_from_file_location(f"{prefix}_{name}", os.path.join(directory, name + ".py"))
+    module = importlib.util.module_from_spec(spec)
+    loaded = set(sys.modules)
+    sys.modules[spec.name] = module
+    sys.path.insert(0, directory)
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[spec.name]
+        raise
+    finally:
+        sys.path.remove(directory)
+        for sibling in set(sys.modules) - loaded - {spec.name}:
+            path = getattr(sys.modules[sibling], "__file__", None)
+            if path and os.path.dirname(os.path.abspath(path)) == directory:
+                sibling_module = sys.modules.pop(sibling)
+                sys.modules[f"{prefix}_{sibling}"] = sibling_module
+                _app_modules[directory, sibling] = sibling_module
+    _app_modules[directory, name] = module
+    return module
+
+class TaskBackend:
+    """Storage protocol behind TaskService; task items are (text, priority, finished)."""
+
+    def create_account(self, username, password):
+        """Return False if the username is taken."""
+        raise NotImplementedError
+
+    def authenticate(self, username, password):
+        """Check the password and get ready to serve the user's tasks."""
+        raise NotImplementedError
+
+    def delete_account(self, username):
+        raise NotImplementedError
+
+    def tasks(self, username):
+        """Return every task of the user as Task tuples, oldest first."""
+        raise NotImplementedError
+
+    def add_many(self, username, items):
+        """Add tasks and return their ids, in order."""
+        raise NotImplementedError
+
+    def search(self, username, keyword):
+        """Return the user's tasks matching keyword, as the format's own search defines it."""
+        raise NotImplementedError
+
+    def edit(self, username, task_id, text, priority):
+        raise NotImplementedError
+
+    def set_finished(self, username, task_ids, finished):
+        raise NotImplementedError
+
+    def set_priority(self, username, task_ids, priority):
+        raise NotImplementedError
+
+    def delete_many(self, username, task_ids):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class JsonBackend(TaskBackend):
+    """
+    Tasks in the sharded JSON store. Pass store= to share an already loaded
+    store, e.g. the GUI's, together with autoflush=False when the caller
+    decides when to write; otherwise every call ends with one flush.
+    """
+
+    def __init__(self, path="accounts.json", store=None, autoflush=True):
+        if store is None:
+            store = ShardedAccountStore(path, autoflush=False)
+            store.load()
+        self.store = store
+        self.autoflush = autoflush
+        self.indexes = {}  # username -> TrigramIndex, once that user has searched
+
+    def _apply(self, ops):
+        for op in ops:
+            self.store.apply(op)
+        if self.autoflush:
+            self.store.flush()
+
+    def create_account(self, username, password):
+        if self.store.account(username) is not None:
+            return False
+        self._apply([{"op": "create_account", "username": username,
+                      "password_hash": hash_password(password).decode('utf-8')}])
+        return True
+
+    def authenticate(self, username, password):
+        account = self.store.account(username)
+        if account is None:
+            return False
+        matches, new_hash = check_password(password, account["password_hash"])
+        if new_hash is not None:
+            self._apply([{"op": "set_password_hash", "username": username, "password_hash": new_hash.decode('utf-8')}])
+        return matches
+
+    def delete_account(self, username):
+        self.indexes.pop(username, None)
+        self._apply([{"op": "delete_account", "username": username}])
+
+    def tasks(self, username):
+        return [Task(index, task["task"], task["priority"], task["finished"])
+                for index, task in enumerate(self.store.tasks(username))]
+
+    def search_index(self, username):
+        """
+        The user's TrigramIndex of task texts by TaskRecord.uid, which app.py
+        filters with too. Built on first use, then kept current by add_many,
+        edit and delete_many; tasks added to the list directly must be added
+        to it by the caller.
+        """
+        index = self.indexes.get(username)
+        if index is None:
+            index = self.indexes[username] = TrigramIndex((task.uid, task["task"]) for task in self.store.tasks(username))
+        return index
+
+    def add_many(self, username, items):
+        start = len(self.store.tasks(username))
+        ops = [{"op": "add_task", "username": username,
+                "task": {"task": text, "priority": bool(priority), "finished": bool(finished)}}
+               for text, priority, finished in items]
+        self._apply(ops)
+        index = self.indexes.get(username)
+        if index is not None:
+            for task in self.store.tasks(username)[start:]:
+                index.add(task.uid, task["task"])
+        return list(range(start, start + len(ops)))
+
+    def search(self, username, keyword):
+        matches = self.search_index(username).search(keyword)
+        return [Task(index, task["task"], task["priority"], task["finished"])
+                for index, task in enumerate(self.store.tasks(username)) if task.uid in matches]
+
+    def edit(self, username, task_id, text, priority):
+        self._apply([{"op": "update_task", "username": username, "index": task_id,
+                      "fields": {"task": text, "priority": bool(priority)}}])
+        if username in self.indexes:
+            self.indexes[username].update(self.store.tasks(username)[task_id].uid, text)
+
+    def set_finished(self, username, task_ids, finished):
+        self._apply([{"op": "update_task", "username": username, "index": index, "fields": {"finished": bool(finished)}}
+                     for index in task_ids])
+
+    def set_priority(self, username, task_ids, priority):
+        self._apply([{"op": "update_task", "username": username, "index": index, "fields": {"priority": bool(priority)}}
+                     for index in task_ids])
+
+    def delete_many(self, username, task_ids):
+        index = self.indexes.get(username)
+        if index is not None:
+            tasks = self.store.tasks(username)
+            for task_id in set(task_ids):
+                index.remove(tasks[task_id].uid)
+        # Highest position first, so the positions still to delete stay valid
+        self._apply([{"op": "delete_task", "username": username, "index": index}
+                     for index in sorted(set(task_ids), reverse=True)])
+
+    def close(self):
+        self.store.flush()
+
+class SqliteBackend(TaskBackend):
+    """Tasks in the plain SQLite database of tests/test_app.py, one transaction per call."""
+
+    def __init__(self, path="todo_app.db"):
+        self.sqlite_app = import_app_module(SQLITE_APP_DIR, "test_app")
+        self.conn = self.sqlite_app.connect_db(path)
+        self.sqlite_app.initialize_db(self.conn)
+
+    def create_account(self, username, password):
+        try:
+            with self.conn:
+                self.conn.execute("INSERT INTO accounts (username, password_hash) VALUES (?, ?)",
+                                  (username, hash_password(password)))
+        except sqlite3.IntegrityError:
+            return False
+        return True
+
+    def authenticate(self, username, password):
+        account = self.conn.execute("SELECT password_hash FROM accounts WHERE username=?", (username,)).fetchone()
+        if account is None:
+            return False
+        matches, new_hash = check_password(password, account[0])
+        if new_hash is not None:
+            with self.conn:
+                self.conn.execute("UPDATE accounts SET password_hash=? WHERE username=?", (new_hash, username))
+        return matches
+
+    def delete_account(self, username):
+        with self.conn:
+            self.conn.execute("DELETE FROM tasks WHERE username=?", (username,))
+            self.conn.execute("DELETE FROM accounts WHERE username=?", (username,))
+
+    def tasks(self, username):
+        rows = self.conn.execute("SELECT id, task, priority, finished FROM tasks WHERE username=? ORDER BY id", (username,))
+        return [Task(*row) for row in rows]
+
+    def add_many(self, username, items):
+        task_ids = []
+        with self.conn:
+            c = self.conn.cursor()
+            for text, priority, finished in items:
+                c.execute("INSERT INTO tasks (username, task, priority, finished) VALUES (?, ?, ?, ?)",
+                          (username, text, int(priority), int(finished)))
+                task_ids.append(c.lastrowid)
+        return task_ids
+
+    def search(self, username, keyword):
+        # FTS5 trigram index, so keywords match as substrings like the JSON backend; every page at once
+        return [Task(*row) for row in self.sqlite_app.search_tasks(self.conn, username, keyword, limit=-1)]
+
+    def edit(self, username, task_id, text, priority):
+        with self.conn:
+            self.conn.execute("UPDATE tasks SET task=?, priority=? WHERE id=? AND username=?",
+                              (text, int(priority), task_id, username))
+
+    def set_finished(self, username, task_ids, finished):
+        with self.conn:
+            self.conn.executemany("UPDATE tasks SET finished=? WHERE id=? AND username=?",
+                                  [(int(finished), task_id, username) for task_id in task_ids])
+
+    def set_priority(self, username, task_ids, priority):
+        with self.conn:
+            self.conn.executemany("UPDATE tasks SET priority=? WHERE id=? AND username=?",
+                                  [(int(priority), task_id, username) for task_id in task_ids])
+
+    def delete_many(self, username, task_ids):
+        with self.conn:
+            self.conn.executemany("DELETE FROM tasks WHERE id=? AND username=?",
+                                  [(task_id, username) for task_id in task_ids])
+
+    def close(self):
+        self.conn.close()
+
+class EncryptedBackend(TaskBackend):
+    """
+    Tasks in the encrypted database of tests/baba. The backend opens its own
+    TaskDatabase on path and passes it to every database call, leaving the
+    module's shared database alone.
+    """
+
+    def __init__(self, path="todo_app.db"):
+        self.database = import_app_module(ENCRYPTED_APP_DIR, "database")
+        self.db = self.database.TaskDatabase(path)
+        self.database.initialize_db(db=self.db)
+        self.keys = {}  # username -> session key, set by authenticate
+
+    def create_account(self, username, password):
+        return self.database.create_account(username, password, db=self.db)
+
+    def authenticate(self, username, password):
+        if not self.database.check_login(username, password, db=self.db):
+            return False
+        self.keys[username] = self.database.unlock_account(username, password, db=self.db)
+        return True
+
+    def delete_account(self, username):
+        self.keys.pop(username, None)
+        self.database.delete_account(username, db=self.db)
+
+    def tasks(self, username):
+        return [Task(*task) for task in self.database.fetch_tasks(username, self.keys[username], db=self.db)]
+
+    def add_many(self, username, items):
+        return self.database.add_tasks(username, items, self.keys[username], db=self.db)
+
+    def search(self, username, keyword):
+        return [Task(*task) for task in self.database.search_tasks(username, keyword, self.keys[username], db=self.db)]
+
+    def edit(self, username, task_id, text, priority):
+        self.database.edit_task(task_id, username, text, int(priority), self.keys[username], db=self.db)
+
+    def set_finished(self, username, task_ids, finished):
+        self.database.set_tasks_finished(task_ids, username, finished, db=self.db)
+
+    def set_priority(self, username, task_ids, priority):
+        self.database.set_tasks_priority(task_ids, username, priority, db=self.db)
+
+    def delete_many(self, username, task_ids):
+        self.database.delete_tasks(task_ids, username, db=self.db)
+
+    def close(self):
+        for username in self.keys:
+            self.database.forget_session_key(username)
+        self.keys = {}
+        self.db.close()
+
+class TaskService:
+    """The task operations of one logged-in user, independent of storage and UI."""
+
+    def __init__(self, backend, username):
+        self.backend = backend
+        self.username = username
+
+    @classmethod
+    def login(cls, backend, username, password):
+        """Return a service for the user, or None if the password is wrong."""
+        if backend.authenticate(username, password):
+            return cls(backend, username)
+        return None
+
+    def tasks(self):
+        return self.backend.tasks(self.username)
+
+    def add(self, text, priority=False):
+        return self.add_many([(text, priority, False)])[0]
+
+    def add_many(self, items):
+        """Add (text, priority, finished) items in one batch and return their ids."""
+        return self.backend.add_many(self.username, list(items))
+
+    def search(self, keyword):
+        return self.backend.search(self.username, keyword)
+
+    def edit(self, task_id, text, priority):
+        self.backend.edit(self.username, task_id, text, priority)
+
+    def complete(self, task_id, finished=True):
+        self.complete_many([task_id], finished)
+
+    def complete_many(self, task_ids, finished=True):
+        """Mark tasks finished (or, with finished=False, pending again) in one batch."""
+        self.backend.set_finished(self.username, list(task_ids), finished)
+
+    def prioritize_many(self, task_ids, priority=True):
+        """Raise (or, with priority=False, lower) the priority of tasks in one batch."""
+        self.backend.set_priority(self.username, list(task_ids), priority)
+
+    def delete(self, task_id):
+        self.delete_many([task_id])
+
+    def delete_many(self, task_ids):
+        self.backend.delete_many(self.username, list(task_ids))
+
+    def delete_account(self):
+        self.backend.delete_account(self.username)
@@ -0,0 +1,9 @@
+# Helpers shared with the JSON app (passwords, tracing, ...) live in app/, two
+# levels up; importing this module makes them importable. Frozen builds get them
+# through the pathex in main_app.spec instead.
+import os
+import sys
+
+APP_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+if APP_DIR not in sys.path:
+    sys.path.append(APP_DIR)
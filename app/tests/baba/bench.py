@@ -0,0 +1,117 @@
+"""Small benchmarks for the encrypted store. Run e.g. `python bench.py crypt`."""
+import argparse
+import os
+import tempfile
+import time
+from cryptography.fernet import Fernet
+from encryption_utils import SessionKey, encrypt_many, decrypt_many
+import database
+from login import authenticate, login_pipeline
+
+def bench_crypt(args):
+    key = SessionKey("bench", Fernet.generate_key())
+    rows = ["Task number %d with some text" % i for i in range(args.rows)]
+    tokens = encrypt_many(rows, key)
+    print(f"{'workers':>8} {'encrypt rows/s':>16} {'decrypt rows/s':>16}")
+    for workers in args.workers:
+        start = time.perf_counter()
+        encrypt_many(rows, key, workers=workers)
+        encrypt_time = time.perf_counter() - start
+        start = time.perf_counter()
+        decrypt_many(tokens, key, workers=workers)
+        decrypt_time = time.perf_counter() - start
+        print(f"{workers:>8} {args.rows / encrypt_time:>16,.0f} {args.rows / decrypt_time:>16,.0f}")
+
+def _mean_ms(func, ids):
+    start = time.perf_counter()
+    for task_id in ids:
+        func(task_id)
+    return (time.perf_counter() - start) * 1000 / len(ids)
+
+def bench_db(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database.DATABASE_NAME = os.path.join(tmpdir, "bench.db")
+        database.initialize_db()
+        database.create_account("bench", "password")
+        key = database.unlock_account("bench", "password")
+        database.add_tasks("bench", [("Task %d" % i, i % 2, 0) for i in range(args.tasks)], key)
+
+        start = time.perf_counter()
+        database.initialize_db()
+        database.fetch_tasks("bench", key)
+        startup = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        pages = database.fetch_task_pages("bench", key)
+        next(pages)
+        first_page = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        for _ in pages:
+            pass
+        last_page = (time.perf_counter() - start) * 1000 / max(1, -(-args.tasks // database.TASK_PAGE_SIZE) - 1)
+
+        ids = list(range(args.tasks + 1, args.tasks + args.ops + 1))
+        add = _mean_ms(lambda task_id: database.add_task("bench", "New task", 0, key), ids)
+        complete = _mean_ms(lambda task_id: database.complete_task(task_id, "bench"), ids)
+        delete = _mean_ms(lambda task_id: database.delete_task(task_id, "bench"), ids)
+
+        # The same number of tasks selected at once: one executemany per action
+        ids = database.add_tasks("bench", [("New task", 0, 0)] * args.ops, key)
+        start = time.perf_counter()
+        database.set_tasks_finished(ids, "bench", True)
+        bulk_complete = (time.perf_counter() - start) * 1000 / len(ids)
+        start = time.perf_counter()
+        database.delete_tasks(ids, "bench")
+        bulk_delete = (time.perf_counter() - start) * 1000 / len(ids)
+        database.close_database()
+    print(f"startup (initialize + fetch {args.tasks} tasks): {startup:.1f} ms")
+    print(f"first page of {database.TASK_PAGE_SIZE}: {first_page:.1f} ms, each later page: {last_page:.1f} ms")
+    print(f"add: {add:.2f} ms  complete: {complete:.2f} ms  delete: {delete:.2f} ms  (mean of {args.ops})")
+    print(f"bulk, per task of {args.ops} selected: complete {bulk_complete:.3f} ms ({complete / bulk_complete:.0f}x), "
+          f"delete {bulk_delete:.3f} ms ({delete / bulk_delete:.0f}x)")
+
+def bench_login(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database.DATABASE_NAME = os.path.join(tmpdir, "bench.db")
+        database.initialize_db()
+        database.create_account("bench", "password")
+        key = database.unlock_account("bench", "password")
+        database.add_tasks("bench", [("Task %d" % i, i % 2, 0) for i in range(args.tasks)], key)
+        database.close_database()  # Each login starts from a cold connection
+        database.forget_session_key("bench")
+
+        start = time.perf_counter()
+        database.fetch_tasks("bench", authenticate("bench", "password"))
+        sequential = (time.perf_counter() - start) * 1000
+        database.close_database()
+        database.forget_session_key("bench")
+
+        start = time.perf_counter()
+        login_pipeline("bench", "password")
+        pipelined = (time.perf_counter() - start) * 1000
+        database.close_database()
+    print(f"login + all {args.tasks} tasks, sequential: {sequential:.0f} ms; "
+          f"login + first page, pipelined with prefetch: {pipelined:.0f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    crypt_parser = commands.add_parser("crypt", help="rows/second of encrypt_many/decrypt_many per worker count")
+    crypt_parser.add_argument("--rows", type=int, default=20000)
+    crypt_parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    crypt_parser.set_defaults(func=bench_crypt)
+
+    db_parser = commands.add_parser("db", help="startup, add/complete/delete latency and bulk speedup of database.py")
+    db_parser.add_argument("--tasks", type=int, default=2000)
+    db_parser.add_argument("--ops", type=int, default=200)
+    db_parser.set_defaults(func=bench_db)
+
+    login_parser = commands.add_parser("login", help="time from Login to decrypted tasks, sequential vs pipelined")
+    login_parser.add_argument("--tasks", type=int, default=20000)
+    login_parser.set_defaults(func=bench_login)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,120 +1,575 @@
 import sqlite3
-import bcrypt
-from crypt import encrypt_data, decrypt_data
+import threading
+import apppath  # noqa: F401  (shared helpers in app/)
+import tracing
+from encryption_utils import (encrypt_data, encrypt_many, decrypt_many, forget_session_key,
+                   get_session_key, derive_key, new_salt, new_data_key, wrap_key, unwrap_key, SessionKey,
+                   blind_tokens, normalize_text)
+from passwords import hash_password, check_password
 
 DATABASE_NAME = "todo_app.db"
 
-def initialize_db():
-    with sqlite3.connect(DATABASE_NAME) as conn:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS accounts
-                     (username TEXT PRIMARY KEY, password_hash TEXT)''')
-        c.execute('''CREATE TABLE IF NOT EXISTS tasks
-                     (id INTEGER PRIMARY KEY, username TEXT, task TEXT, 
-                      priority INTEGER, finished INTEGER,
-                      FOREIGN KEY(username) REFERENCES accounts(username))''')
+# Rows re-encrypted per round trip when migrating or rotating keys
+REENCRYPT_BATCH_SIZE = 1000
+# Rows encrypted and written per executemany when importing or exporting
+IMPORT_BATCH_SIZE = 5000
+# Rows read and decrypted per page when the task list is shown; about a screenful or two
+TASK_PAGE_SIZE = 200
+
+# Whether new accounts get a blind search index. It lets SQL narrow a search
+# without decrypting, at the cost of revealing which tasks share trigrams.
+BLIND_INDEX_NEW_ACCOUNTS = False
+
+# Connection tuning; cache_size is in KiB when negative
+STATEMENT_CACHE_SIZE = 128
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=67108864",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+class TaskDatabase:
+    """
+    Owns long-lived, tuned connections to the task database, one per thread.
+    Use `with db.connection() as conn:` for a transaction; it commits on success
+    and rolls back on error but keeps the connection open.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Each thread only uses its own connection, but close() may run on another thread
+            conn = sqlite3.connect(self.path, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+
+_database = None
+
+def get_database(db=None):
+    """
+    Return db if given, else the shared TaskDatabase for DATABASE_NAME, reopening
+    it if the name changed. Every function below takes an optional db, so a
+    caller can work on a database of its own without touching DATABASE_NAME.
+    """
+    global _database
+    if db is not None:
+        return db
+    if _database is None or _database.path != DATABASE_NAME:
+        close_database()
+        _database = TaskDatabase(DATABASE_NAME)
+    return _database
+
+def close_database():
+    global _database
+    if _database is not None:
+        _database.close()
+        _database = None
+
+def _create_base_tables(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS accounts
+                 (username TEXT PRIMARY KEY, password_hash TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS tasks
+                 (id INTEGER PRIMARY KEY, username TEXT, task TEXT,
+                  priority INTEGER, finished INTEGER,
+                  FOREIGN KEY(username) REFERENCES accounts(username))''')
+
+def _add_envelope_key_columns(c):
+    # Databases created before envelope encryption lack the key columns
+    columns = [row[1] for row in c.execute("PRAGMA table_info(accounts)")]
+    if "salt" not in columns:
+        c.execute("ALTER TABLE accounts ADD COLUMN salt BLOB")
+    if "wrapped_key" not in columns:
+        c.execute("ALTER TABLE accounts ADD COLUMN wrapped_key TEXT")
+
+def _add_task_indexes(c):
+    # Per-user lookups (fetch, delete account, status filters) no longer scan the table
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user ON tasks (username, finished, priority, id)")
+
+def _drop_orphaned_tasks(c):
+    # Deleted tasks of deleted accounts here, which silently threw away user data;
+    # now a no-op that keeps later version numbers. See purge_orphaned_tasks().
+    pass
+
+def _add_blind_index(c):
+    # Opt-in per account; task_tokens holds keyed trigram tokens of each task
+    columns = [row[1] for row in c.execute("PRAGMA table_info(accounts)")]
+    if "blind_index" not in columns:
+        c.execute("ALTER TABLE accounts ADD COLUMN blind_index INTEGER NOT NULL DEFAULT 0")
+    c.execute('''CREATE TABLE IF NOT EXISTS task_tokens
+                 (token BLOB, task_id INTEGER REFERENCES tasks(id) ON DELETE CASCADE,
+                  PRIMARY KEY (token, task_id)) WITHOUT ROWID''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_task_tokens_task ON task_tokens (task_id)")
+
+def _add_task_page_index(c):
+    # Keyset pages (username=? AND id>? ORDER BY id) become a range scan with no sort
+    c.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_id ON tasks (username, id)")
+
+# Ordered schema migrations; PRAGMA user_version records how many have been applied.
+# Never reorder or edit a released migration, only append new ones.
+MIGRATIONS = [
+    _create_base_tables,
+    _add_envelope_key_columns,
+    _add_task_indexes,
+    _drop_orphaned_tasks,
+    _add_blind_index,
+    _add_task_page_index,
+]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+@tracing.traced("db.initialize_db")
+def initialize_db(db=None):
+    """Bring the schema up to date, applying each pending migration in its own transaction."""
+    conn = get_database(db).connection()
+    for version in range(schema_version(conn), len(MIGRATIONS)):
+        conn.execute("BEGIN")
+        try:
+            MIGRATIONS[version](conn.cursor())
+            conn.execute(f"PRAGMA user_version={version + 1}")
+        except Exception:
+            conn.rollback()
+            raise
         conn.commit()
 
-def create_account(username, password):
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
-    with sqlite3.connect(DATABASE_NAME) as conn:
+@tracing.traced("db.create_account")
+def create_account(username, password, blind_index=None, db=None):
+    if blind_index is None:
+        blind_index = BLIND_INDEX_NEW_ACCOUNTS
+    hashed_password = hash_password(password)
+    salt = new_salt()
+    wrapped_key = wrap_key(new_data_key(), password, salt)
+    with get_database(db).connection() as conn:
         c = conn.cursor()
         try:
-            c.execute("INSERT INTO accounts (username, password_hash) VALUES (?, ?)", 
-                      (username, hashed_password))
+            c.execute("INSERT INTO accounts (username, password_hash, salt, wrapped_key, blind_index) VALUES (?, ?, ?, ?, ?)",
+                      (username, hashed_password, salt, wrapped_key, int(blind_index)))
             conn.commit()
             return True
         except sqlite3.IntegrityError:
             return False
 
-def check_login(username, password):
-    with sqlite3.connect(DATABASE_NAME) as conn:
+@tracing.traced("db.check_login")
+def check_login(username, password, db=None):
+    with get_database(db).connection() as conn:
         c = conn.cursor()
         c.execute("SELECT password_hash FROM accounts WHERE username=?", (username,))
         account = c.fetchone()
-        if account and bcrypt.checkpw(password.encode('utf-8'), account[0]):
-            return True
-        else:
+        if not account:
             return False
+        with tracing.span("auth.bcrypt", username=username):
+            matches, new_hash = check_password(password, account[0])
+        if new_hash is not None:
+            # Stored with an outdated cost; upgrade it now that we know the password
+            c.execute("UPDATE accounts SET password_hash=? WHERE username=?", (new_hash, username))
+            conn.commit()
+        return matches
+
+@tracing.traced("db.unlock_account")
+def unlock_account(username, password, db=None):
+    """
+    Return the session key of an authenticated user.
+    Legacy accounts are migrated to a wrapped data key on their first login.
+    """
+    with get_database(db).connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT salt, wrapped_key FROM accounts WHERE username=?", (username,))
+        account = c.fetchone()
+    if account is None:
+        return None
+    salt, wrapped_key = account
+    if wrapped_key is None:
+        salt, wrapped_key = migrate_account(username, password, db=db)
+    return get_session_key(username, password, salt, wrapped_key)
+
+@tracing.traced("db.migrate_account")
+def migrate_account(username, password, db=None):
+    """
+    One-shot migration of a legacy account: its tasks, encrypted directly under
+    the password, are streamed through re-encryption under a new random data key,
+    and the wrapped key is stored in the same transaction.
+    """
+    legacy_key = SessionKey(username, derive_key(password))  # legacy salt, no wrapping
+    data_key = new_data_key()
+    salt = new_salt()
+    wrapped_key = wrap_key(data_key, password, salt)
+    with get_database(db).connection() as conn:
+        c = conn.cursor()
+        _reencrypt_rows(c, username, legacy_key, SessionKey(username, data_key))
+        c.execute("UPDATE accounts SET salt=?, wrapped_key=? WHERE username=?", (salt, wrapped_key, username))
+        conn.commit()
+    return salt, wrapped_key
+
+@tracing.traced("db.change_password")
+def change_password(username, old_password, new_password, db=None):
+    """
+    Change a user's password by rewrapping the data key; no task is re-encrypted.
+    """
+    if not check_login(username, old_password, db=db):
+        return False
+    with get_database(db).connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT salt, wrapped_key FROM accounts WHERE username=?", (username,))
+        salt, wrapped_key = c.fetchone()
+    if wrapped_key is None:
+        salt, wrapped_key = migrate_account(username, old_password, db=db)
+    data_key = unwrap_key(wrapped_key, old_password, salt)
+    new_account_salt = new_salt()
+    hashed_password = hash_password(new_password)
+    with get_database(db).connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE accounts SET password_hash=?, salt=?, wrapped_key=? WHERE username=?",
+                  (hashed_password, new_account_salt, wrap_key(data_key, new_password, new_account_salt), username))
+        conn.commit()
+    forget_session_key(username)
+    return True
 
-def add_task(username, task, priority, password):
-    encrypted_task = encrypt_data(task, password)
-    with sqlite3.connect(DATABASE_NAME) as conn:
+@tracing.traced("db.add_task")
+def add_task(username, task, priority, key, db=None):
+    encrypted_task = encrypt_data(task, key)
+    with get_database(db).connection() as conn:
         c = conn.cursor()
         c.execute("INSERT INTO tasks (username, task, priority, finished) VALUES (?, ?, ?, 0)",
                   (username, encrypted_task, priority))
+        task_id = c.lastrowid
+        if _blind_index_enabled(c, username):
+            _index_tasks(c, [(task_id, task)], key)
         conn.commit()
+        return task_id
+
+def add_tasks(username, tasks, key, db=None):
+    """
+    Insert many (description, priority, finished) tasks in one transaction and return their ids.
+    """
+    task_ids = []
+    import_tasks(username, tasks, key, task_ids=task_ids, db=db)
+    return task_ids
 
-def fetch_tasks(username, password):
-    tasks = []
-    with sqlite3.connect(DATABASE_NAME) as conn:
+@tracing.traced("db.import_tasks")
+def import_tasks(username, tasks, key, progress=None, task_ids=None, db=None):
+    """
+    Insert an iterable of (description, priority, finished) tasks in one transaction.
+    Tasks are encrypted and written batch by batch, so the iterable can be a stream;
+    progress, if given, is called with the running count after each batch, and
+    the new ids are appended to task_ids if a list is given.
+    """
+    count = 0
+    with get_database(db).connection() as conn:
         c = conn.cursor()
-        c.execute("SELECT id, task, priority, finished FROM tasks WHERE username=?", (username,))
-        encrypted_tasks = c.fetchall()
-        for task in encrypted_tasks:
-            decrypted_task = list(task)
-            decrypted_task[1] = decrypt_data(task[1], password)  # Decrypt task description
-            tasks.append(decrypted_task)
-    return tasks
+        indexed = _blind_index_enabled(c, username)
+        for batch in _batches(tasks, IMPORT_BATCH_SIZE):
+            encrypted = encrypt_many([task[0] for task in batch], key)
+            rows = [(username, token, int(task[1]), int(task[2])) for token, task in zip(encrypted, batch)]
+            c.executemany("INSERT INTO tasks (username, task, priority, finished) VALUES (?, ?, ?, ?)", rows)
+            if indexed or task_ids is not None:
+                # id is an INTEGER PRIMARY KEY without AUTOINCREMENT, so inside this
+                # transaction each row got the previous highest id plus one: the
+                # batch holds the contiguous range ending at the last inserted id.
+                last_id = c.execute("SELECT last_insert_rowid()").fetchone()[0]
+                batch_ids = range(last_id - len(rows) + 1, last_id + 1)
+                if indexed:
+                    _index_tasks(c, [(task_id, task[0]) for task_id, task in zip(batch_ids, batch)], key)
+                if task_ids is not None:
+                    task_ids.extend(batch_ids)
+            count += len(batch)
+            if progress:
+                progress(count)
+    return count
 
-def update_task(task_id, username, new_task_description, priority, finished, password):
+def iter_tasks(username, key, batch_size=None, db=None):
     """
-    Update an existing task with new details.
+    Yield a user's decrypted tasks as [id, description, priority, finished] in id order,
+    reading and decrypting one batch at a time.
     """
-    encrypted_task = encrypt_data(new_task_description, password)
-    with sqlite3.connect(DATABASE_NAME) as conn:
+    for page in fetch_task_pages(username, key, batch_size or IMPORT_BATCH_SIZE, db=db):
+        yield from page
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+@tracing.traced("db.fetch_encrypted_page")
+def fetch_encrypted_page(username, after_id=0, limit=TASK_PAGE_SIZE, db=None):
+    """
+    Read up to limit encrypted task rows with an id above after_id, in id order.
+    Keyset pagination: each page is one range scan of the (username, id) index,
+    however deep into the list it starts.
+    """
+    with get_database(db).connection() as conn:
+        rows = conn.execute("SELECT id, task, priority, finished FROM tasks WHERE username=? AND id>? ORDER BY id LIMIT ?",
+                            (username, after_id, limit)).fetchall()
+    tracing.count("db.rows_read", len(rows))
+    return rows
+
+def fetch_task_page(username, key, after_id=0, limit=TASK_PAGE_SIZE, db=None):
+    """Read and decrypt one page of tasks; see fetch_encrypted_page()."""
+    return decrypt_tasks(fetch_encrypted_page(username, after_id, limit, db=db), key)
+
+def fetch_task_pages(username, key, page_size=TASK_PAGE_SIZE, after_id=0, db=None):
+    """
+    Yield a user's decrypted tasks a page (a list) at a time, starting after
+    after_id. A page is read and decrypted only when the generator is advanced,
+    so memory and time stay proportional to what the caller has consumed.
+    """
+    while True:
+        page = fetch_task_page(username, key, after_id, page_size, db=db)
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        after_id = page[-1][0]
+
+@tracing.traced("db.fetch_encrypted_tasks")
+def fetch_encrypted_tasks(username, db=None):
+    """Read a user's task rows without decrypting them; needs no key."""
+    with get_database(db).connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, task, priority, finished FROM tasks WHERE username=? ORDER BY id", (username,))
+        rows = c.fetchall()
+    tracing.count("db.rows_read", len(rows))
+    return rows
+
+def decrypt_tasks(encrypted_tasks, key):
+    # Decrypt the whole batch at once instead of row by row
+    descriptions = decrypt_many([task[1] for task in encrypted_tasks], key)
+    return [[task[0], description, task[2], task[3]] for task, description in zip(encrypted_tasks, descriptions)]
+
+@tracing.traced("db.fetch_tasks")
+def fetch_tasks(username, key, db=None):
+    return decrypt_tasks(fetch_encrypted_tasks(username, db=db), key)
+
+@tracing.traced("db.search_tasks")
+def search_tasks(username, keyword, key, db=None):
+    """
+    Return the decrypted tasks of a user whose description contains keyword,
+    case-insensitively, as [id, description, priority, finished] in id order.
+    With the user's blind index enabled, SQL first narrows the rows to those
+    holding every trigram of the keyword and only those are decrypted.
+    """
+    return [task for page in search_task_pages(username, keyword, key, IMPORT_BATCH_SIZE, db=db) for task in page]
+
+def search_task_pages(username, keyword, key, page_size=TASK_PAGE_SIZE, after_id=0, db=None):
+    """
+    Run search_tasks() a page of candidate rows at a time: read up to
+    page_size rows past after_id, decrypt them and yield the matches among
+    them, which may be none. A caller can stop once it has enough matches.
+    """
+    needle = normalize_text(keyword)
+    tokens = blind_tokens(keyword, key)
+    with get_database(db).connection() as conn:
+        blind_index = bool(tokens) and _blind_index_enabled(conn.cursor(), username)
+    if blind_index:
+        marks = ",".join("?" * len(tokens))
+        sql = f"""SELECT id, task, priority, finished FROM tasks WHERE username=? AND id>? AND id IN
+                  (SELECT task_id FROM task_tokens WHERE token IN ({marks})
+                   GROUP BY task_id HAVING COUNT(*)=?) ORDER BY id LIMIT ?"""
+    else:
+        sql = "SELECT id, task, priority, finished FROM tasks WHERE username=? AND id>? ORDER BY id LIMIT ?"
+    while True:
+        params = (username, after_id, *tokens, len(tokens), page_size) if blind_index else (username, after_id, page_size)
+        with get_database(db).connection() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        if not rows:
+            return
+        descriptions = decrypt_many([row[1] for row in rows], key)
+        # Tokens only say a task has the trigrams; the substring check confirms the match
+        yield [[row[0], description, row[2], row[3]] for row, description in zip(rows, descriptions)
+               if needle in normalize_text(description)]
+        after_id = rows[-1][0]
+
+@tracing.traced("db.enable_blind_index")
+def enable_blind_index(username, key, db=None):
+    """Build the blind search index of a user's existing tasks and keep it up to date from now on."""
+    with get_database(db).connection() as conn:
         c = conn.cursor()
-        c.execute("UPDATE tasks SET task=?, priority=?, finished=? WHERE id=? AND username=?", (encrypted_task, priority, finished, task_id, username))
+        c.execute("DELETE FROM task_tokens WHERE task_id IN (SELECT id FROM tasks WHERE username=?)", (username,))
+        last_id = 0
+        while True:
+            c.execute("SELECT id, task FROM tasks WHERE username=? AND id>? ORDER BY id LIMIT ?",
+                      (username, last_id, REENCRYPT_BATCH_SIZE))
+            rows = c.fetchall()
+            if not rows:
+                break
+            descriptions = decrypt_many([row[1] for row in rows], key)
+            _index_tasks(c, [(row[0], description) for row, description in zip(rows, descriptions)], key)
+            last_id = rows[-1][0]
+        c.execute("UPDATE accounts SET blind_index=1 WHERE username=?", (username,))
         conn.commit()
 
-def complete_task(task_id, username, password):
+def disable_blind_index(username, db=None):
+    """Drop a user's blind search index; searches decrypt every task again."""
+    with get_database(db).connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM task_tokens WHERE task_id IN (SELECT id FROM tasks WHERE username=?)", (username,))
+        c.execute("UPDATE accounts SET blind_index=0 WHERE username=?", (username,))
+        conn.commit()
+
+def _blind_index_enabled(c, username):
+    c.execute("SELECT blind_index FROM accounts WHERE username=?", (username,))
+    row = c.fetchone()
+    return bool(row and row[0])
+
+def _index_tasks(c, tasks, key, replace=False):
+    # tasks are (id, description) pairs; replace drops their old tokens first
+    if replace:
+        c.executemany("DELETE FROM task_tokens WHERE task_id=?", [(task_id,) for task_id, _ in tasks])
+    c.executemany("INSERT OR IGNORE INTO task_tokens (token, task_id) VALUES (?, ?)",
+                  [(token, task_id) for task_id, description in tasks for token in blind_tokens(description, key)])
+
+@tracing.traced("db.reencrypt_tasks")
+def reencrypt_tasks(username, old_key, new_key, db=None):
     """
-    Mark a task as completed.
+    Re-encrypt every task of a user under a new key, in one transaction.
     """
-    # Fetch the current task to re-encrypt it, as its encryption might depend on mutable data like 'finished' status if included in encryption.
-    with sqlite3.connect(DATABASE_NAME) as conn:
+    with get_database(db).connection() as conn:
         c = conn.cursor()
-        c.execute("SELECT task FROM tasks WHERE id=? AND username=?", (task_id, username))
-        task_row = c.fetchone()
-        if task_row:
-            # Re-encrypt the task with the updated 'finished' status.
-            encrypted_task = encrypt_data(decrypt_data(task_row[0], password), password)
-            c.execute("UPDATE tasks SET finished=1, task=? WHERE id=? AND username=?", (encrypted_task, task_id, username))
-            conn.commit()
+        _reencrypt_rows(c, username, old_key, new_key)
+        conn.commit()
+
+def _reencrypt_rows(c, username, old_key, new_key):
+    # Walk the user's rows in id order, one batch at a time, so memory stays flat
+    indexed = _blind_index_enabled(c, username)
+    last_id = 0
+    while True:
+        c.execute("SELECT id, task FROM tasks WHERE username=? AND id>? ORDER BY id LIMIT ?",
+                  (username, last_id, REENCRYPT_BATCH_SIZE))
+        rows = c.fetchall()
+        if not rows:
+            break
+        descriptions = decrypt_many([row[1] for row in rows], old_key)
+        tokens = encrypt_many(descriptions, new_key)
+        c.executemany("UPDATE tasks SET task=? WHERE id=?", [(token, row[0]) for token, row in zip(tokens, rows)])
+        if indexed:
+            # Index tokens are keyed by the data key, so they change with it
+            _index_tasks(c, [(row[0], description) for row, description in zip(rows, descriptions)], new_key, replace=True)
+        last_id = rows[-1][0]
+
+# Columns of a task that update_task_fields() may write
+TASK_COLUMNS = ("task", "priority", "finished")
 
-def uncomplete_task(task_id, username, password):
+@tracing.traced("db.update_task_fields")
+def update_task_fields(task_id, username, key=None, db=None, **fields):
     """
-    Mark a task as not completed.
+    Write only the given columns of one task, e.g. update_task_fields(7, "bob", finished=1).
+    Only a new description (task=...) is encrypted and needs the key; priority
+    and finished are stored in the clear, so changing them is one UPDATE by
+    primary key with no crypto. Returns whether the task was found.
     """
-    # Similar logic to `complete_task` but marking the task as not finished.
-    with sqlite3.connect(DATABASE_NAME) as conn:
+    unknown = set(fields) - set(TASK_COLUMNS)
+    if unknown:
+        raise ValueError("Unknown task columns: " + ", ".join(sorted(unknown)))
+    if not fields:
+        return False
+    values = dict(fields)
+    if "task" in values:
+        values["task"] = encrypt_data(fields["task"], key)
+    with get_database(db).connection() as conn:
         c = conn.cursor()
-        c.execute("SELECT task FROM tasks WHERE id=? AND username=?", (task_id, username))
-        task_row = c.fetchone()
-        if task_row:
-            encrypted_task = encrypt_data(decrypt_data(task_row[0], password), password)
-            c.execute("UPDATE tasks SET finished=0, task=? WHERE id=? AND username=?", (encrypted_task, task_id, username))
-            conn.commit()
+        c.execute(f"UPDATE tasks SET {', '.join(column + '=?' for column in values)} WHERE id=? AND username=?",
+                  (*values.values(), task_id, username))
+        found = c.rowcount > 0
+        if found and "task" in fields and _blind_index_enabled(c, username):
+            _index_tasks(c, [(task_id, fields["task"])], key, replace=True)
+    return found
+
+@tracing.traced("db.update_task")
+def update_task(task_id, username, new_task_description, priority, finished, key, db=None):
+    """
+    Update an existing task with new details.
+    """
+    update_task_fields(task_id, username, key, task=new_task_description, priority=priority, finished=finished, db=db)
+
+@tracing.traced("db.complete_task")
+def complete_task(task_id, username, db=None):
+    """
+    Mark a task as completed. Only the finished flag is written; the encrypted text is left alone.
+    """
+    update_task_fields(task_id, username, finished=1, db=db)
+
+@tracing.traced("db.uncomplete_task")
+def uncomplete_task(task_id, username, db=None):
+    """
+    Mark a task as not completed, without touching its encrypted text.
+    """
+    update_task_fields(task_id, username, finished=0, db=db)
 
-def edit_task(task_id, username, new_task_description, priority, password):
+@tracing.traced("db.edit_task")
+def edit_task(task_id, username, new_task_description, priority, key, db=None):
     """
     Edit the description and priority of an existing task.
     """
-    encrypted_task = encrypt_data(new_task_description, password)
-    with sqlite3.connect(DATABASE_NAME) as conn:
-        c = conn.cursor()
-        c.execute("UPDATE tasks SET task=?, priority=? WHERE id=? AND username=?", (encrypted_task, priority, task_id, username))
-        conn.commit()
+    update_task_fields(task_id, username, key, task=new_task_description, priority=priority, db=db)
+
+@tracing.traced("db.set_tasks_finished")
+def set_tasks_finished(task_ids, username, finished, db=None):
+    """
+    Mark many tasks finished (or pending) in one transaction. The finished flag
+    is stored in the clear, so nothing is decrypted or re-encrypted.
+    """
+    with get_database(db).connection() as conn:
+        conn.executemany("UPDATE tasks SET finished=? WHERE id=? AND username=?",
+                         [(int(finished), task_id, username) for task_id in task_ids])
+
+@tracing.traced("db.set_tasks_priority")
+def set_tasks_priority(task_ids, username, priority, db=None):
+    """Set the priority of many tasks in one transaction, without any crypto."""
+    with get_database(db).connection() as conn:
+        conn.executemany("UPDATE tasks SET priority=? WHERE id=? AND username=?",
+                         [(int(priority), task_id, username) for task_id in task_ids])
+
+@tracing.traced("db.delete_tasks")
+def delete_tasks(task_ids, username, db=None):
+    """Delete many tasks in one transaction."""
+    with get_database(db).connection() as conn:
+        conn.executemany("DELETE FROM tasks WHERE id=? AND username=?", [(task_id, username) for task_id in task_ids])
 
-def delete_task(id, username):
-    with sqlite3.connect(DATABASE_NAME) as conn:
+@tracing.traced("db.delete_task")
+def delete_task(id, username, db=None):
+    with get_database(db).connection() as conn:
         c = conn.cursor()
         c.execute("DELETE FROM tasks WHERE id=? AND username=?", (id, username))
         conn.commit()
 
-def delete_account(username):
-    with sqlite3.connect(DATABASE_NAME) as conn:
+@tracing.traced("db.delete_account")
+def delete_account(username, db=None):
+    forget_session_key(username)
+    with get_database(db).connection() as conn:
         c = conn.cursor()
-        c.execute("DELETE FROM tasks WHERE username=?", (username,))  # Delete user's tasks first due to FK constraint
+        c.execute("DELETE FROM tasks WHERE username=?", (username,))  # Delete user's tasks first due to FK constraint; their tokens cascade
         c.execute("DELETE FROM accounts WHERE username=?", (username,))
-        conn.commit()
\ No newline at end of file
+        conn.commit()
+@tracing.traced("db.purge_orphaned_tasks")
+def purge_orphaned_tasks(db=None):
+    """
+    Delete tasks whose account no longer exists, as left by databases from
+    before foreign keys were enforced. Never run implicitly; returns how many
+    tasks were deleted so the caller can report it.
+    """
+    with get_database(db).connection() as conn:
+        return conn.execute("DELETE FROM tasks WHERE username NOT IN (SELECT username FROM accounts)").rowcount
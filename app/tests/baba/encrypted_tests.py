@@ -0,0 +1,306 @@
+import unittest
+import os
+import tempfile
+import sqlite3
+import apppath  # noqa: F401  (shared helpers in app/)
+import encryption_utils
+import database
+import encrypted_transfer
+import login
+import passwords
+import tracing
+
+class TestEncryptedStore(unittest.TestCase):
+    def setUp(self):
+        # Point the database module at a throwaway file for each test
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_database_name = database.DATABASE_NAME
+        database.DATABASE_NAME = os.path.join(self.tmpdir.name, "todo_app.db")
+        database.initialize_db()
+        encryption_utils.clear_key_cache()
+
+    def tearDown(self):
+        encryption_utils.clear_key_cache()
+        database.close_database()
+        database.DATABASE_NAME = self.old_database_name
+        self.tmpdir.cleanup()
+
+    def login(self, username="testuser", password="password123"):
+        database.create_account(username, password)
+        self.assertTrue(database.check_login(username, password))
+        return database.unlock_account(username, password)
+
+    def test_connection_is_shared_and_tuned(self):
+        conn = database.get_database().connection()
+        self.assertIs(database.get_database().connection(), conn)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+
+    def query_plan(self, sql, params):
+        conn = database.get_database().connection()
+        return " ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+    def test_migrations_are_recorded_and_idempotent(self):
+        database.initialize_db()
+        conn = database.get_database().connection()
+        self.assertEqual(database.schema_version(conn), len(database.MIGRATIONS))
+
+    def test_each_migration_can_be_reapplied(self):
+        # Migrations must tolerate a schema that already has their change
+        database.initialize_db()
+        with database.get_database().connection() as conn:
+            c = conn.cursor()
+            for migration in database.MIGRATIONS:
+                migration(c)
+
+    def test_legacy_database_is_migrated(self):
+        # A version 0 database with the original schema and an orphaned task
+        database.close_database()
+        os.remove(database.DATABASE_NAME)
+        with sqlite3.connect(database.DATABASE_NAME) as conn:
+            conn.execute("CREATE TABLE accounts (username TEXT PRIMARY KEY, password_hash TEXT)")
+            conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY, username TEXT, task TEXT, "
+                         "priority INTEGER, finished INTEGER, FOREIGN KEY(username) REFERENCES accounts(username))")
+            conn.execute("INSERT INTO tasks (username, task, priority, finished) VALUES ('ghost', 'x', 0, 0)")
+        conn.close()
+        database.initialize_db()
+        conn = database.get_database().connection()
+        self.assertEqual(database.schema_version(conn), len(database.MIGRATIONS))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0], 1)  # Kept until purged on request
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(accounts)")]
+        self.assertIn("wrapped_key", columns)
+        self.assertEqual(database.purge_orphaned_tasks(), 1)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0], 0)
+
+    def test_foreign_keys_are_enforced(self):
+        with self.assertRaises(sqlite3.IntegrityError):
+            database.add_task("nobody", "x", 0, encryption_utils.SessionKey("nobody", encryption_utils.new_data_key()))
+
+    def test_hot_queries_use_indexes(self):
+        plan = self.query_plan("SELECT id, task, priority, finished FROM tasks WHERE username=?", ("u",))
+        self.assertIn("USING INDEX idx_tasks_user", plan)
+        plan = self.query_plan("DELETE FROM tasks WHERE username=?", ("u",))
+        self.assertIn("USING COVERING INDEX idx_tasks_user", plan)
+        plan = self.query_plan("SELECT COUNT(*) FROM tasks WHERE username=? AND finished=? AND priority=?", ("u", 0, 1))
+        self.assertIn("USING COVERING INDEX idx_tasks_user", plan)
+        plan = self.query_plan("UPDATE tasks SET finished=1 WHERE id=? AND username=?", (1, "u"))
+        self.assertIn("INTEGER PRIMARY KEY", plan)
+        plan = self.query_plan("SELECT id, task, priority, finished FROM tasks WHERE username=? AND id>? ORDER BY id LIMIT ?",
+                               ("u", 0, 200))
+        self.assertIn("USING INDEX idx_tasks_user_id (username=? AND id>?)", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_session_key_is_derived_once(self):
+        key = self.login()
+        self.assertIs(database.unlock_account("testuser", "password123"), key)
+
+    def test_session_key_cache_is_bounded(self):
+        salt = encryption_utils.new_salt()
+        wrapped_key = encryption_utils.wrap_key(encryption_utils.new_data_key(), "pw", salt)
+        for i in range(encryption_utils.KEY_CACHE_SIZE + 3):
+            encryption_utils.get_session_key("user%d" % i, "pw", salt, wrapped_key)
+        self.assertEqual(len(encryption_utils._key_cache), encryption_utils.KEY_CACHE_SIZE)
+
+    def test_wrong_password_cannot_unwrap_data_key(self):
+        self.login()
+        with self.assertRaises(encryption_utils.InvalidToken):
+            database.unlock_account("testuser", "wrong password")
+
+    def test_change_password_rewraps_key_only(self):
+        key = self.login()
+        database.add_task("testuser", "Do laundry", 0, key)
+        with sqlite3.connect(database.DATABASE_NAME) as conn:
+            before = conn.execute("SELECT task FROM tasks").fetchall()
+        self.assertTrue(database.change_password("testuser", "password123", "new password"))
+        with sqlite3.connect(database.DATABASE_NAME) as conn:
+            self.assertEqual(conn.execute("SELECT task FROM tasks").fetchall(), before)
+        new_key = database.unlock_account("testuser", "new password")
+        self.assertEqual(database.fetch_tasks("testuser", new_key)[0][1], "Do laundry")
+
+    def test_legacy_account_is_migrated_on_unlock(self):
+        # Simulate a database written before per-user salts and wrapped keys
+        database.create_account("olduser", "pw")
+        with sqlite3.connect(database.DATABASE_NAME) as conn:
+            conn.execute("UPDATE accounts SET salt=NULL, wrapped_key=NULL")
+            conn.execute("INSERT INTO tasks (username, task, priority, finished) VALUES (?, ?, 1, 0)",
+                         ("olduser", encryption_utils.encrypt_data("legacy task", "pw")))
+        key = database.unlock_account("olduser", "pw")
+        self.assertEqual([t[1] for t in database.fetch_tasks("olduser", key)], ["legacy task"])
+        with sqlite3.connect(database.DATABASE_NAME) as conn:
+            self.assertIsNotNone(conn.execute("SELECT wrapped_key FROM accounts").fetchone()[0])
+
+    def test_tasks_round_trip_with_session_key(self):
+        key = self.login()
+        database.add_task("testuser", "Do laundry", 1, key)
+        tasks = database.fetch_tasks("testuser", key)
+        self.assertEqual([t[1] for t in tasks], ["Do laundry"])
+        self.assertEqual(tasks[0][2], 1)
+
+    def test_encrypt_many_round_trip_across_workers(self):
+        key = self.login()
+        items = ["task %d" % i for i in range(encryption_utils.PARALLEL_THRESHOLD + 7)]
+        tokens = encryption_utils.encrypt_many(items, key, workers=4)
+        self.assertEqual(encryption_utils.decrypt_many(tokens, key, workers=4), items)
+        self.assertEqual(encryption_utils.decrypt_many(tokens[:3], key, workers=1), items[:3])
+
+    def test_bulk_add_and_reencrypt(self):
+        key = self.login()
+        database.add_tasks("testuser", [("a", 0, 0), ("b", 1, 1)], key)
+        new_key = encryption_utils.SessionKey("testuser", encryption_utils.new_data_key())
+        database.reencrypt_tasks("testuser", key, new_key)
+        tasks = database.fetch_tasks("testuser", new_key)
+        self.assertEqual([t[1:] for t in tasks], [["a", 0, 0], ["b", 1, 1]])
+
+    def test_concurrent_logins_do_not_starve_their_prefetch(self):
+        self.login()
+        logins = [login._login_pool.submit(login.login_pipeline, "testuser", "password123") for _ in range(4)]
+        for pending in logins:
+            self.assertIsNotNone(pending.result(timeout=30))
+
+    def test_import_and_export_stream_in_batches(self):
+        key = self.login()
+        source = os.path.join(self.tmpdir.name, "in.csv")
+        encrypted_transfer.write_tasks(source, ({"task": "task %d" % i, "priority": i % 2, "finished": 0} for i in range(25)))
+        seen = []
+        old_batch_size = database.IMPORT_BATCH_SIZE
+        database.IMPORT_BATCH_SIZE = 10
+        try:
+            self.assertEqual(encrypted_transfer.import_file("testuser", source, key, seen.append), 25)
+            target = os.path.join(self.tmpdir.name, "out.jsonl")
+            self.assertEqual(encrypted_transfer.export_file("testuser", target, key), 25)
+        finally:
+            database.IMPORT_BATCH_SIZE = old_batch_size
+        self.assertEqual(seen, [10, 20, 25])
+        self.assertEqual(list(encrypted_transfer.read_tasks(target)), list(encrypted_transfer.read_tasks(source)))
+
+    def test_status_changes_leave_ciphertext_alone(self):
+        key = self.login()
+        database.add_task("testuser", "first", 0, key)
+        database.add_task("testuser", "second", 0, key)
+        database.add_task("testuser", "third", 0, key)
+        first, second, third = [task[0] for task in database.fetch_tasks("testuser", key)]
+        database.delete_task(second, "testuser")  # Ids no longer follow list positions
+        conn = database.get_database().connection()
+        before = conn.execute("SELECT task FROM tasks WHERE id=?", (third,)).fetchone()[0]
+        database.complete_task(third, "testuser")
+        self.assertEqual(conn.execute("SELECT task, finished FROM tasks WHERE id=?", (third,)).fetchone(), (before, 1))
+        database.uncomplete_task(third, "testuser")
+        database.edit_task(third, "testuser", "third, edited", 1, key)
+        self.assertEqual(database.fetch_tasks("testuser", key), [[first, "first", 0, 0], [third, "third, edited", 1, 0]])
+        self.assertTrue(database.update_task_fields(first, "testuser", priority=1))
+        self.assertFalse(database.update_task_fields(second, "testuser", finished=1))
+        with self.assertRaises(ValueError):
+            database.update_task_fields(first, "testuser", owner="other")
+
+    def test_bulk_updates_touch_only_the_given_tasks(self):
+        key = self.login()
+        ids = database.add_tasks("testuser", [("a", 0, 0), ("b", 0, 0), ("c", 0, 0)], key)
+        database.set_tasks_finished(ids[:2], "testuser", True)
+        database.set_tasks_priority(ids[1:], "testuser", 1)
+        database.delete_tasks([ids[0]], "otheruser")  # Not theirs, nothing happens
+        self.assertEqual(database.fetch_tasks("testuser", key),
+                         [[ids[0], "a", 0, 1], [ids[1], "b", 1, 1], [ids[2], "c", 1, 0]])
+        database.delete_tasks(ids[:2], "testuser")
+        self.assertEqual([task[0] for task in database.fetch_tasks("testuser", key)], [ids[2]])
+
+    def test_added_ids_match_their_rows(self):
+        key = self.login()
+        last_id = database.add_tasks("testuser", [("a", 0, 0), ("b", 0, 0)], key)[-1]
+        database.delete_tasks([last_id], "testuser")  # Its id is handed out again
+        old_batch_size, database.IMPORT_BATCH_SIZE = database.IMPORT_BATCH_SIZE, 2
+        self.addCleanup(setattr, database, "IMPORT_BATCH_SIZE", old_batch_size)
+        ids = database.add_tasks("testuser", [("task %d" % i, 0, 0) for i in range(5)], key)
+        self.assertEqual({task[0]: task[1] for task in database.fetch_tasks("testuser", key)[1:]},
+                         {task_id: "task %d" % i for i, task_id in enumerate(ids)})
+
+    def test_task_pages_are_read_lazily(self):
+        key = self.login()
+        ids = database.add_tasks("testuser", [("task %d" % i, 0, 0) for i in range(7)], key)
+        database.delete_tasks(ids[1:3], "testuser")
+        pages = database.fetch_task_pages("testuser", key, page_size=2)
+        self.assertEqual([task[0] for task in next(pages)], [ids[0], ids[3]])
+        new_id = database.add_task("testuser", "added while paging", 0, key)
+        self.assertEqual([[task[0] for task in page] for page in pages], [[ids[4], ids[5]], [ids[6], new_id]])
+        self.assertEqual(database.fetch_task_page("testuser", key, after_id=ids[5]),
+                         [[ids[6], "task 6", 0, 0], [new_id, "added while paging", 0, 0]])
+        self.assertEqual(list(database.fetch_task_pages("testuser", key, after_id=new_id)), [])
+
+    def test_blind_index_search(self):
+        key = self.login()
+        database.add_tasks("testuser", [("Buy milk", 0, 0), ("Call the plumber", 1, 0), ("Milkshake", 0, 1)], key)
+        self.assertEqual([t[1] for t in database.search_tasks("testuser", "MILK", key)], ["Buy milk", "Milkshake"])
+        database.enable_blind_index("testuser", key)
+        self.assertEqual([t[1] for t in database.search_tasks("testuser", "MILK", key)], ["Buy milk", "Milkshake"])
+        task_id = database.add_task("testuser", "Fix the milking stool", 0, key)
+        database.edit_task(1, "testuser", "Buy bread", 0, key)
+        database.delete_task(3, "testuser")
+        self.assertEqual([t[0] for t in database.search_tasks("testuser", "milk", key)], [task_id])
+        self.assertEqual([t[1] for t in database.search_tasks("testuser", "plumb", key)], ["Call the plumber"])
+        self.assertEqual(len(database.search_tasks("testuser", "ll", key)), 1)  # Too short for tokens
+        pages = list(database.search_task_pages("testuser", "milk", key, page_size=1))
+        self.assertEqual([[t[0] for t in page] for page in pages], [[task_id]])  # Only the indexed candidate is read
+        database.disable_blind_index("testuser")
+        conn = database.get_database().connection()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM task_tokens").fetchone()[0], 0)
+        pages = database.search_task_pages("testuser", "milk", key, page_size=1)
+        self.assertEqual([[t[0] for t in page] for page in pages], [[], [], [task_id]])  # A page per row read
+
+    def test_blind_tokens_are_keyed_per_user(self):
+        key = self.login()
+        other_key = self.login("otheruser")
+        self.assertLessEqual(encryption_utils.blind_tokens("Milk", key), encryption_utils.blind_tokens("some milk", key))
+        self.assertFalse(encryption_utils.blind_tokens("milk", key) & encryption_utils.blind_tokens("milk", other_key))
+        self.assertTrue(database.create_account("indexed", "pw", blind_index=True))
+        indexed_key = database.unlock_account("indexed", "pw")
+        database.add_task("indexed", "secret", 0, indexed_key)
+        conn = database.get_database().connection()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM task_tokens").fetchone()[0], 4)
+        database.delete_account("indexed")
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM task_tokens").fetchone()[0], 0)
+
+    def test_login_pipeline_prefetches_tasks(self):
+        key = self.login()
+        database.add_tasks("testuser", [("a", 0, 0), ("b", 1, 1)], key)
+        self.assertIsNone(login.login_pipeline("testuser", "wrong"))
+        self.assertIsNone(login.login_pipeline("nobody", "password123"))
+        session_key, tasks = login.login_pipeline("testuser", "password123")
+        self.assertIs(session_key, key)
+        self.assertEqual([t[1:] for t in tasks], [["a", 0, 0], ["b", 1, 1]])
+
+    def test_password_hash_is_upgraded_on_login(self):
+        old_rounds = passwords.BCRYPT_ROUNDS
+        try:
+            passwords.BCRYPT_ROUNDS = 4
+            database.create_account("testuser", "password123")
+            passwords.BCRYPT_ROUNDS = 5
+            self.assertFalse(database.check_login("testuser", "wrong"))
+            conn = database.get_database().connection()
+            stored = conn.execute("SELECT password_hash FROM accounts").fetchone()[0]
+            self.assertEqual(passwords.hash_rounds(stored), 4)
+            self.assertTrue(database.check_login("testuser", "password123"))
+            stored = conn.execute("SELECT password_hash FROM accounts").fetchone()[0]
+            self.assertEqual(passwords.hash_rounds(stored), 5)
+            self.assertTrue(database.check_login("testuser", "password123"))
+        finally:
+            passwords.BCRYPT_ROUNDS = old_rounds
+
+    def test_tracing_covers_crypto_and_storage(self):
+        tracing.enable()
+        self.addCleanup(tracing.reset)
+        self.addCleanup(tracing.disable)
+        key = self.login()
+        database.add_tasks("testuser", [("a", 0, 0), ("b", 1, 1)], key)
+        database.fetch_tasks("testuser", key)
+        names = {span["name"] for span in tracing.spans}
+        self.assertTrue({"auth.bcrypt", "crypt.pbkdf2", "db.unlock_account", "crypt.decrypt_many"} <= names)
+        self.assertEqual(tracing.counters["db.rows_read"], 2)
+        self.assertEqual(tracing.counters["crypt.decrypted_rows"], 2)
+
+    def test_delete_account_wipes_cached_key(self):
+        key = self.login()
+        database.delete_account("testuser")
+        self.assertNotIn("testuser", [k[0] for k in encryption_utils._key_cache])
+        self.assertFalse(database.check_login("testuser", "password123"))
+
+if __name__ == '__main__':
+    unittest.main()
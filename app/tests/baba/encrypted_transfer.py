@@ -0,0 +1,41 @@
+"""Bulk import and export of tasks as CSV or JSON Lines.
+
+    python encrypted_transfer.py import USERNAME tasks.csv
+    python encrypted_transfer.py export USERNAME tasks.jsonl
+"""
+import argparse
+import getpass
+import sys
+import database
+import apppath  # noqa: F401  (shared helpers in app/)
+from json_transfer import FIELDS, read_tasks, write_tasks, _print_progress
+
+def import_file(username, path, key, progress=None):
+    tasks = (tuple(task[field] for field in FIELDS) for task in read_tasks(path))
+    return database.import_tasks(username, tasks, key, progress)
+
+def export_file(username, path, key):
+    tasks = (dict(zip(FIELDS, (task[1], bool(task[2]), bool(task[3])))) for task in database.iter_tasks(username, key))
+    return write_tasks(path, tasks)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=("import", "export"))
+    parser.add_argument("username")
+    parser.add_argument("path", help="a .csv or .jsonl file")
+    args = parser.parse_args()
+
+    database.initialize_db()
+    password = getpass.getpass()
+    if not database.check_login(args.username, password):
+        sys.exit("Incorrect username or password.")
+    key = database.unlock_account(args.username, password)
+    if args.action == "import":
+        count = import_file(args.username, args.path, key, _print_progress)
+        print(file=sys.stderr)
+        print(f"Imported {count} tasks.")
+    else:
+        print(f"Exported {export_file(args.username, args.path, key)} tasks.")
+
+if __name__ == "__main__":
+    main()
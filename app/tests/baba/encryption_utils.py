@@ -0,0 +1,165 @@
+# encryption_utils.py
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.backends import default_backend
+from cryptography.fernet import Fernet, InvalidToken
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import base64
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+import unicodedata
+import apppath  # noqa: F401  (shared helpers in app/)
+import tracing
+
+# Derived keys are kept for a bounded number of sessions and expire after a while
+KEY_CACHE_SIZE = 8
+KEY_CACHE_TTL = 15 * 60  # seconds
+
+# Batches smaller than this are not worth handing to a thread pool
+PARALLEL_THRESHOLD = 512
+
+_key_cache = OrderedDict()
+_key_cache_lock = threading.Lock()
+
+# Salt of accounts created before per-user salts; only used to migrate them
+LEGACY_SALT = b"unused_salt"
+SALT_SIZE = 16
+
+# Blind index tokens are truncated HMAC-SHA256 digests of word trigrams
+BLIND_TOKEN_SIZE = 16
+_WORD = re.compile(r"\w+")
+
+@tracing.traced("crypt.pbkdf2")
+def derive_key(password: str, salt: bytes = LEGACY_SALT) -> bytes:
+    """Derive a key-encryption key from the user's password and salt."""
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=salt,
+        iterations=100000,
+        backend=default_backend()
+    )
+    return base64.urlsafe_b64encode(kdf.derive(password.encode()))
+
+def new_salt() -> bytes:
+    """Return a fresh random per-user salt."""
+    return os.urandom(SALT_SIZE)
+
+def new_data_key() -> bytes:
+    """Return a fresh random data-encryption key for a user's tasks."""
+    return Fernet.generate_key()
+
+def wrap_key(data_key: bytes, password: str, salt: bytes) -> str:
+    """Encrypt a data key under the key derived from the password."""
+    return Fernet(derive_key(password, salt)).encrypt(data_key).decode()
+
+def unwrap_key(wrapped_key: str, password: str, salt: bytes) -> bytes:
+    """Recover a data key; raises InvalidToken if the password is wrong."""
+    return Fernet(derive_key(password, salt)).decrypt(wrapped_key.encode())
+
+class SessionKey:
+    """A user's data key, unwrapped once at login and reused for every task of the session."""
+
+    def __init__(self, username: str, key: bytes):
+        self.username = username
+        self.fernet = Fernet(key)
+        # Separate subkey for the blind search index, so tokens never reuse the encryption key
+        self.index_key = hmac.new(base64.urlsafe_b64decode(key), b"blind-index", hashlib.sha256).digest()
+
+    def encrypt(self, data: str) -> str:
+        return self.fernet.encrypt(data.encode()).decode()
+
+    def decrypt(self, token: str) -> str:
+        return self.fernet.decrypt(token.encode()).decode()
+
+def normalize_text(text: str) -> str:
+    """Case- and form-insensitive version of text, as used for searching."""
+    return unicodedata.normalize("NFKC", text).casefold()
+
+def blind_tokens(text: str, key: SessionKey) -> set:
+    """
+    Keyed tokens for the trigrams of every word of text. Equal trigrams give
+    equal tokens for the same user, so the database can match them without
+    ever seeing the text; words shorter than three characters give none.
+    """
+    tokens = set()
+    for word in _WORD.findall(normalize_text(text)):
+        for i in range(len(word) - 2):
+            digest = hmac.new(key.index_key, word[i:i + 3].encode(), hashlib.sha256).digest()
+            tokens.add(digest[:BLIND_TOKEN_SIZE])
+    return tokens
+
+def get_session_key(username: str, password: str, salt: bytes, wrapped_key: str) -> SessionKey:
+    """Return the session key for a user, unwrapping it only on a cache miss."""
+    cache_key = (username, hashlib.sha256(salt + password.encode()).digest())
+    now = time.monotonic()
+    with _key_cache_lock:
+        entry = _key_cache.get(cache_key)
+        if entry is not None and entry[1] > now:
+            _key_cache.move_to_end(cache_key)
+            return entry[0]
+    session_key = SessionKey(username, unwrap_key(wrapped_key, password, salt))
+    with _key_cache_lock:
+        _key_cache[cache_key] = (session_key, now + KEY_CACHE_TTL)
+        _key_cache.move_to_end(cache_key)
+        while len(_key_cache) > KEY_CACHE_SIZE:
+            _key_cache.popitem(last=False)
+    return session_key
+
+def forget_session_key(username: str):
+    """Drop every cached key of a user (logout, account deletion)."""
+    with _key_cache_lock:
+        for cache_key in [k for k in _key_cache if k[0] == username]:
+            del _key_cache[cache_key]
+
+def clear_key_cache():
+    """Drop every cached key."""
+    with _key_cache_lock:
+        _key_cache.clear()
+
+def _fernet_for(key) -> Fernet:
+    # Accept a SessionKey or, for legacy rows, the plain password
+    if isinstance(key, SessionKey):
+        return key.fernet
+    return Fernet(derive_key(key))
+
+def encrypt_data(data: str, key) -> str:
+    """Encrypt the given data using a session key (or a password)."""
+    return _fernet_for(key).encrypt(data.encode()).decode()
+
+def decrypt_data(token: str, key) -> str:
+    """Decrypt the given token using a session key (or a password)."""
+    return _fernet_for(key).decrypt(token.encode()).decode()
+
+def _map_batch(func, items, workers):
+    """Apply func to every item, splitting large batches across threads."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(items) < PARALLEL_THRESHOLD:
+        return [func(item) for item in items]
+    size = -(-len(items) // workers)  # ceil division, one chunk per worker
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(lambda chunk: [func(item) for item in chunk], chunks)
+    return [item for chunk in results for item in chunk]
+
+def encrypt_many(items, key, workers=None) -> list:
+    """Encrypt a list of strings with one Fernet instance, in parallel for large batches."""
+    fernet = _fernet_for(key)
+    items = list(items)
+    tracing.count("crypt.encrypted_rows", len(items))
+    with tracing.span("crypt.encrypt_many", rows=len(items)):
+        return _map_batch(lambda data: fernet.encrypt(data.encode()).decode(), items, workers)
+
+def decrypt_many(tokens, key, workers=None) -> list:
+    """Decrypt a list of tokens with one Fernet instance, in parallel for large batches."""
+    fernet = _fernet_for(key)
+    tokens = list(tokens)
+    tracing.count("crypt.decrypted_rows", len(tokens))
+    with tracing.span("crypt.decrypt_many", rows=len(tokens)):
+        return _map_batch(lambda token: fernet.decrypt(token.encode()).decode(), tokens, workers)
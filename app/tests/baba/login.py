@@ -1,6 +1,37 @@
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import messagebox, ttk
-from database import check_login, create_account
+from database import check_login, create_account, unlock_account, fetch_encrypted_page, decrypt_tasks
+
+# Authentication and key derivation run here instead of on the Tk thread
+_login_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="login")
+# The first task read runs on its own pool: a login job waits on its prefetch, so
+# sharing one pool would deadlock once every worker is a waiting login
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+# How often the Tk thread checks for a finished login
+POLL_MS = 20
+
+def authenticate(username, password):
+    """Check the password and unwrap the data key; returns None if the login fails."""
+    if not check_login(username, password):
+        return None
+    return unlock_account(username, password)  # Unwrap the data key once for the whole session
+
+def login_pipeline(username, password, pool=_prefetch_pool):
+    """
+    Run a whole login on a worker: while bcrypt and the key derivation run,
+    the first page of the user's encrypted rows is already read from SQLite on
+    another worker. Returns (key, decrypted first page), or None if the login
+    fails, in which case the prefetched rows are dropped unread. MainApp reads
+    the remaining pages as they are needed.
+    """
+    prefetch = pool.submit(fetch_encrypted_page, username)
+    key = authenticate(username, password)
+    if key is None:
+        prefetch.cancel()
+        return None
+    return key, decrypt_tasks(prefetch.result(), key)
 
 class LoginWindow:
     def __init__(self, parent, login_success_callback):
@@ -17,18 +48,36 @@ class LoginWindow:
         self.password_entry = tk.Entry(self.window, show="*", font=("Arial", 12))
         self.password_entry.pack(pady=5, padx=10)
 
-        ttk.Button(self.window, text="Login", command=self.login).pack(pady=5, padx=10)
+        self.login_button = ttk.Button(self.window, text="Login", command=self.login)
+        self.login_button.pack(pady=5, padx=10)
         ttk.Button(self.window, text="Create Account", command=self.create_account_prompt).pack(pady=5, padx=10)
 
     def login(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
-        if check_login(username, password):
-            messagebox.showinfo("Login Successful", "Welcome, " + username + "!")
-            self.window.destroy()
-            self.login_success_callback(username, password)
-        else:
+        self.login_button.state(["disabled"])
+        self.login_started = time.perf_counter()
+        self.pending_login = _login_pool.submit(login_pipeline, username, password)
+        self.window.after(POLL_MS, self.poll_login, username)
+
+    def poll_login(self, username):
+        # Tk is not thread-safe, so the worker's result is picked up here, on the Tk thread
+        if not self.pending_login.done():
+            self.window.after(POLL_MS, self.poll_login, username)
+            return
+        self.login_button.state(["!disabled"])
+        try:
+            result = self.pending_login.result()
+        except Exception as error:
+            # Raised on the worker; reported here instead of escaping the after callback
+            messagebox.showerror("Login Failed", f"Could not log in: {error}")
+            return
+        if result is None:
             messagebox.showerror("Login Failed", "Incorrect username or password.")
+            return
+        key, tasks = result
+        self.window.destroy()
+        self.login_success_callback(username, key, tasks, self.login_started)
 
     def create_account_prompt(self):
         username = self.username_entry.get()
@@ -1,14 +1,35 @@
 import tkinter as tk
 from tkinter import simpledialog, messagebox, ttk
-from database import fetch_tasks, add_task, edit_task, complete_task, uncomplete_task, delete_task, delete_account
+from database import (TASK_PAGE_SIZE, fetch_task_page, fetch_task_pages, search_task_pages, add_task, edit_task,
+                      set_tasks_finished, set_tasks_priority, delete_tasks, delete_account)
+from encryption_utils import forget_session_key, normalize_text
+import apppath  # noqa: F401  (shared helpers in app/)
+from listview import TaskListView
+from searchindex import TrigramIndex
+import tracing
+
+# Search-as-you-type waits for a pause in typing this long
+SEARCH_DELAY_MS = 150
 
 class MainApp:
-    def __init__(self, root, username, password):
+    def __init__(self, root, username, key, tasks=None, login_started=None):
         self.root = root
         self.username = username
-        self.password = password  # Storing password securely for future use
+        self.key = key  # Session key derived once at login, never the password itself
+        self.root.protocol("WM_DELETE_WINDOW", self.logout)
+        # F12 writes the trace (TODO_TRACE=1) and profile (TODO_PROFILE=...) collected so far
+        self.root.bind_all("<F12>", lambda event: tracing.dump())
+        self.filter_after_id = None
+        # The database search a filter runs while pages are unread; see filter_tasks()
+        self.search_after_id = None
+        self.search_pages = None
+        self.search_ids = None  # Ids of its matches in id order; None when no such search is shown
+        self.found = {}  # id -> task it matched that the pages have not read yet
         self.setup_ui()
-        self.load_tasks()
+        self.load_tasks(tasks)  # First page prefetched during login, if any
+        if login_started is not None and tracing.enabled():
+            self.root.update_idletasks()
+            tracing.record("ui.first_paint", login_started, rows=len(self.tasks))
 
     def setup_ui(self):
         self.root.title(f"Todo App - {self.username}")
@@ -27,23 +48,29 @@ class MainApp:
 
         # Filter field
         self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", self.schedule_filter)
         self.filter_entry = tk.Entry(self.root, textvariable=self.filter_var, font=("Arial", 12))
         self.filter_entry.pack(pady=5, padx=50)
         filter_button = ttk.Button(self.root, text="Filter Tasks", command=self.filter_tasks)
         filter_button.pack(pady=2, padx=50)
 
         # Task list display
-        self.task_listbox = tk.Listbox(self.root, font=("Arial", 12), height=15)
+        # Shift/Ctrl-click selects many tasks; the buttons below act on all of them at once
+        self.task_listbox = tk.Listbox(self.root, font=("Arial", 12), height=15, selectmode=tk.EXTENDED)
         self.task_listbox.pack(pady=5, padx=50, fill='both', expand=True)
+        self.task_view = TaskListView(self.task_listbox, on_end=self.load_more_tasks)
 
         # Task operation buttons
         edit_task_button = ttk.Button(self.root, text="Edit Selected Task", command=self.edit_selected_task)
         edit_task_button.pack(side=tk.LEFT, pady=5, padx=10)
 
-        complete_task_button = ttk.Button(self.root, text="Complete Selected Task", command=self.complete_selected_task)
+        complete_task_button = ttk.Button(self.root, text="Complete Selected Tasks", command=self.complete_selected_task)
         complete_task_button.pack(side=tk.LEFT, pady=5, padx=10)
 
-        delete_task_button = ttk.Button(self.root, text="Delete Selected Task", command=self.delete_selected_task)
+        priority_button = ttk.Button(self.root, text="Toggle Priority", command=self.toggle_selected_priority)
+        priority_button.pack(side=tk.LEFT, pady=5, padx=10)
+
+        delete_task_button = ttk.Button(self.root, text="Delete Selected Tasks", command=self.delete_selected_task)
         delete_task_button.pack(side=tk.LEFT, pady=5, padx=10)
 
         delete_account_button = ttk.Button(self.root, text="Delete Account", command=self.delete_current_account)
@@ -53,59 +80,233 @@ class MainApp:
         task_description = self.task_entry.get()
         priority = self.priority_var.get()
         if task_description:
-            add_task(self.username, task_description, priority, self.password)
+            task_id = add_task(self.username, task_description, priority, self.key)
+            self.tasks[task_id] = [task_id, task_description, priority, 0]
+            if self.pages is not None:
+                self.added_ids.add(task_id)
+                if self.search_ids is not None and self.search_pages is None and \
+                        normalize_text(self.filter_var.get()) in normalize_text(task_description):
+                    self.search_ids.append(task_id)  # The finished database search could not see it
+            self.search_index.add(task_id, task_description)
             self.task_entry.delete(0, tk.END)
-            self.load_tasks()
+            self.task_changed(task_id)
         else:
             messagebox.showinfo("Info", "Task description cannot be empty.")
 
-    def load_tasks(self):
-        self.tasks = fetch_tasks(self.username, self.password)
-        self.display_tasks()
+    def load_tasks(self, tasks=None):
+        # Only the first page is read and decrypted up front. Later pages follow
+        # when the list is scrolled near its end; until all are read, a filter
+        # searches the database instead (see search_more()).
+        # Every action then updates its own entry of self.tasks and writes only that row.
+        if tasks is None:
+            tasks = fetch_task_page(self.username, self.key)
+        self.tasks = {task[0]: task for task in tasks}  # id -> task, in id order
+        self.rows = {task_id: self.format_row(task) for task_id, task in self.tasks.items()}
+        # Normalized like the database search, so a filter matches the same tasks before and after all pages are read
+        self.search_index = TrigramIndex(((task[0], task[1]) for task in self.tasks.values()), normalize=normalize_text)
+        # Pages not read yet; None once every task is in self.tasks. A short
+        # first page is all there is, so small accounts search the index at once.
+        if len(tasks) < TASK_PAGE_SIZE:
+            self.pages = None
+        else:
+            self.pages = fetch_task_pages(self.username, self.key, after_id=tasks[-1][0])
+        self.added_ids = set()  # Added while pages were unread; they sort after every stored task
+        self.filter_tasks()  # Keeps the current filter applied
+
+    def read_page(self):
+        """Merge the next page into self.tasks; returns it, or None when all are read."""
+        page = next(self.pages, None) if self.pages is not None else None
+        if page is None:
+            self.pages = None
+            self.added_ids = set()
+            return None
+        # Tasks added this session have the highest ids, so keep them after the page
+        added = [self.tasks.pop(task_id) for task_id in self.added_ids if task_id in self.tasks]
+        page = [task for task in page if task[0] not in self.added_ids]
+        for task in page + added:
+            self.tasks[task[0]] = task
+        for task in page:
+            self.found.pop(task[0], None)  # Now read for good
+            self.rows[task[0]] = self.format_row(task)
+            self.search_index.add(task[0], task[1])
+        return page
+
+    def load_more_tasks(self):
+        # Called by the view when the list is scrolled near its end
+        if self.search_ids is not None:
+            if self.search_pages is not None and self.search_after_id is None:
+                self.search_target = len(self.search_ids) + self.task_view.page_size
+                self.search_more()
+            return
+        with tracing.span("render.load_page") as load:
+            page = self.read_page()
+            if not page:
+                return
+            if self.added_ids or self.filter_var.get():
+                self.filter_tasks()
+            else:
+                self.task_view.extend_rows([self.rows[task[0]] for task in page])
+            load.set(rows=len(page))
+
+    def format_row(self, task):
+        return (task[0], f"{task[1]} - {'High' if task[2] else 'Low'} Priority - {'Completed' if task[3] else 'Pending'}", None)
 
     def display_tasks(self, tasks=None):
-        if tasks:
-            self.tasks = tasks
-        self.task_listbox.delete(0, tk.END)
-        for task in self.tasks:
-            display_text = f"{task[1]} - {'High' if task[2] else 'Low'} Priority - {'Completed' if task[3] else 'Pending'}"
-            self.task_listbox.insert(tk.END, display_text)
+        if tasks is None:
+            tasks = self.tasks.values()
+        # Rows are keyed by task id; only the ones that changed are redrawn
+        with tracing.span("render.task_list") as render:
+            rows = [self.rows[task[0]] for task in tasks]
+            self.task_view.set_rows(rows)
+            render.set(rows=len(rows))
 
-    def complete_selected_task(self):
-        selection = self.task_listbox.curselection()
-        if selection:
-            task_id = self.task_listbox.curselection()[0] + 1  # Simplification
-            current_status = self.tasks[selection[0]][3]  # Assuming 3rd index is 'finished' status
-            new_status = 0 if current_status else 1
-            if (new_status):
-                complete_task(task_id, self.username, self.password)
+    def task_changed(self, task_id):
+        """Re-render one task after it was added, edited or removed in self.tasks."""
+        self.tasks_changed([task_id])
+
+    def tasks_changed(self, task_ids):
+        """Re-render tasks after a change to self.tasks, then refresh the view once."""
+        for task_id in task_ids:
+            task = self.task(task_id)
+            if task is not None:
+                self.rows[task_id] = self.format_row(task)
             else:
-                uncomplete_task(task_id, self.username, self.password)
-            self.load_tasks()
+                self.rows.pop(task_id, None)
+        if self.search_ids is not None:
+            self.show_search_results()  # Keep the database search's results instead of starting over
+        else:
+            self.filter_tasks()
+
+    def task(self, task_id):
+        """The task with this id, whether read with the pages or found by a search; None if deleted."""
+        task = self.tasks.get(task_id)
+        return task if task is not None else self.found.get(task_id)
+
+    def selected_task(self):
+        selected = self.selected_tasks()
+        return selected[0] if selected else None
+
+    def selected_tasks(self):
+        return [self.task(task_id) for task_id in self.task_view.selected_keys()]
+
+    def complete_selected_task(self):
+        # Completes the selection, or reopens it when every selected task is already completed
+        tasks = self.selected_tasks()
+        if tasks:
+            finished = 0 if all(task[3] for task in tasks) else 1
+            set_tasks_finished([task[0] for task in tasks], self.username, finished)
+            for task in tasks:
+                task[3] = finished
+            self.tasks_changed([task[0] for task in tasks])
+
+    def toggle_selected_priority(self):
+        # Lowers the priority when every selected task is high priority, otherwise raises it
+        tasks = self.selected_tasks()
+        if tasks:
+            priority = 0 if all(task[2] for task in tasks) else 1
+            set_tasks_priority([task[0] for task in tasks], self.username, priority)
+            for task in tasks:
+                task[2] = priority
+            self.tasks_changed([task[0] for task in tasks])
 
     def edit_selected_task(self):
-        selection = self.task_listbox.curselection()
-        if selection:
-            task_id = self.task_listbox.curselection()[0] + 1
+        task = self.selected_task()
+        if task:
             new_description = simpledialog.askstring("Edit Task", "New task description:")
             if new_description is not None:
-                new_priority = messagebox.askyesno("Edit Task", "Is this a high-priority task?")
-                edit_task(task_id, self.username, new_description, int(new_priority), self.password)
-                self.load_tasks()
+                new_priority = int(messagebox.askyesno("Edit Task", "Is this a high-priority task?"))
+                edit_task(task[0], self.username, new_description, new_priority, self.key)
+                task[1], task[2] = new_description, new_priority
+                if task[0] in self.tasks:
+                    self.search_index.update(task[0], new_description)
+                self.task_changed(task[0])
 
     def delete_selected_task(self):
-        selection = self.task_listbox.curselection()
-        if selection:
-            task_id = self.task_listbox.curselection()[0] + 1
-            delete_task(task_id, self.username)
-            self.load_tasks()
+        tasks = self.selected_tasks()
+        if len(tasks) > 1 and not messagebox.askyesno("Confirm", f"Delete {len(tasks)} tasks?"):
+            return
+        if tasks:
+            delete_tasks([task[0] for task in tasks], self.username)
+            for task in tasks:
+                self.tasks.pop(task[0], None)
+                self.found.pop(task[0], None)
+                self.search_index.remove(task[0])
+            self.tasks_changed([task[0] for task in tasks])
 
     def delete_current_account(self):
         if messagebox.askyesno("Confirm", "Are you sure you want to delete your account? All data will be lost."):
             delete_account(self.username)
             self.root.destroy()
 
+    def logout(self):
+        forget_session_key(self.username)
+        self.root.destroy()
+
+    def schedule_filter(self, *args):
+        # Search as you type, once typing pauses
+        if self.filter_after_id is not None:
+            self.root.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.root.after(SEARCH_DELAY_MS, self.run_scheduled_filter)
+
+    def run_scheduled_filter(self):
+        self.filter_after_id = None
+        self.filter_tasks()
+
     def filter_tasks(self):
-        keyword = self.filter_var.get().lower()
-        filtered_tasks = [task for task in fetch_tasks(self.username, self.password) if keyword in task[1].lower()]
-        self.display_tasks(filtered_tasks)
\ No newline at end of file
+        self.stop_search()
+        keyword = self.filter_var.get()
+        if not keyword:
+            self.display_tasks()
+            return
+        if self.pages is None:
+            # Every task is decrypted already; the index over them answers at once
+            matches = self.search_index.search(keyword)
+            self.display_tasks([self.tasks[task_id] for task_id in sorted(matches)])
+            return
+        # Pages are still unread: search the database instead of reading them all
+        self.search_pages = search_task_pages(self.username, keyword, self.key)
+        self.search_ids = []
+        self.search_target = self.task_view.page_size
+        self.display_tasks([])
+        self.search_more()
+
+    def search_more(self):
+        """
+        Scan one page of rows for the database search and show its matches.
+        The next page follows once Tk is idle, so typing stays responsive,
+        until a screenful of matches is shown; scrolling to the end asks for
+        another screenful.
+        """
+        self.search_after_id = None
+        if self.search_pages is None:
+            return
+        with tracing.span("render.search_page") as scan:
+            page = next(self.search_pages, None)
+            if page is None:
+                self.search_pages = None
+                return
+            for task in page:
+                if task[0] not in self.tasks:
+                    self.found.setdefault(task[0], task)
+                    self.rows.setdefault(task[0], self.format_row(task))
+                self.search_ids.append(task[0])
+            if page:
+                self.show_search_results()
+            scan.set(rows=len(page))
+        if len(self.search_ids) < self.search_target:
+            self.search_after_id = self.root.after_idle(self.search_more)
+
+    def show_search_results(self):
+        self.display_tasks([task for task in map(self.task, self.search_ids) if task is not None])
+
+    def stop_search(self):
+        """Cancel the database search, if one is running, and forget its results."""
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = None
+        self.search_pages = None
+        self.search_ids = None
+        for task_id in self.found:
+            if task_id not in self.tasks:
+                self.rows.pop(task_id, None)
+        self.found = {}
\ No newline at end of file
@@ -1,4 +1,5 @@
 # -*- mode: python ; coding: utf-8 -*-
+import os
 
 
 block_cipher = None
@@ -6,7 +7,7 @@ block_cipher = None
 
 a = Analysis(
     ['main_app.py'],
-    pathex=[],
+    pathex=[os.path.join(SPECPATH, '..', '..')],  # app/, for the helpers shared with the JSON app
     binaries=[],
     datas=[],
     hiddenimports=[],
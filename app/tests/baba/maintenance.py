@@ -0,0 +1,18 @@
+"""Maintenance commands for the task database.
+
+    python maintenance.py purge-orphans    delete tasks of accounts that no longer exist
+"""
+import argparse
+import database
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("action", choices=("purge-orphans",))
+    args = parser.parse_args()
+
+    database.initialize_db()
+    if args.action == "purge-orphans":
+        print(f"Deleted {database.purge_orphaned_tasks()} tasks of deleted accounts from {database.DATABASE_NAME}.")
+
+if __name__ == "__main__":
+    main()
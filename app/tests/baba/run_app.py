@@ -3,17 +3,17 @@ from login import LoginWindow
 from main_app import MainApp
 from database import initialize_db
 
-def start_main_app(username, password):
-    app = MainApp(root, username, password)
+def start_main_app(username, key, tasks, login_started):
+    app = MainApp(root, username, key, tasks, login_started)
 
 if __name__ == "__main__":
     initialize_db()
     root = tk.Tk()
     root.withdraw()  # Initially hide the main window
 
-    def on_login_success(username, password):
+    def on_login_success(username, key, tasks, login_started):
         root.deiconify()  # Show the main window upon successful login
-        start_main_app(username, password)
+        start_main_app(username, key, tasks, login_started)
 
     login_window = LoginWindow(root, on_login_success)
 
@@ -0,0 +1,721 @@
+import unittest
+import os
+import sys
+import tempfile
+import time
+import json
+import sqlite3
+
+# The JSON store modules live next to app.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import json_transfer
+from journal import JournalStore
+from accountstore import ShardedAccountStore
+from writebehind import WriteBehindSaver
+from listview import TaskListView
+from searchindex import TrigramIndex
+import test_app
+import passwords
+import taskservice
+from taskservice import TaskService, JsonBackend, SqliteBackend, EncryptedBackend
+from taskmodel import TaskRecord, compact_tasks, measure
+import benchsuite
+import workload
+import tracing
+import pstats
+
+class TestTransfer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_round_trip_csv_and_jsonl(self):
+        tasks = [{"task": "Buy milk", "priority": True, "finished": False},
+                 {"task": "Café, \"quoted\"", "priority": False, "finished": True}]
+        for name in ("tasks.csv", "tasks.jsonl"):
+            self.assertEqual(json_transfer.write_tasks(self.path(name), tasks), 2)
+            self.assertEqual(list(json_transfer.read_tasks(self.path(name))), tasks)
+
+    def test_import_appends_and_reports_progress(self):
+        json_transfer.write_tasks(self.path("tasks.jsonl"),
+                                  ({"task": "t%d" % i, "priority": False, "finished": False} for i in range(25)))
+        task_list = [{"task": "existing", "priority": False, "finished": False}]
+        seen = []
+        old_every = json_transfer.PROGRESS_EVERY
+        json_transfer.PROGRESS_EVERY = 10
+        try:
+            count = json_transfer.import_tasks(task_list, json_transfer.read_tasks(self.path("tasks.jsonl")), seen.append)
+        finally:
+            json_transfer.PROGRESS_EVERY = old_every
+        self.assertEqual(count, 25)
+        self.assertEqual(len(task_list), 26)
+        self.assertEqual(seen, [10, 20, 25])
+
+class TestJournalStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "accounts.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def populate(self, store):
+        store.apply({"op": "create_account", "username": "u", "password_hash": "h"})
+        store.apply({"op": "add_task", "username": "u", "task": {"task": "a", "priority": False, "finished": False}})
+        store.apply({"op": "add_task", "username": "u", "task": {"task": "b", "priority": True, "finished": False}})
+        store.apply({"op": "update_task", "username": "u", "index": 0, "fields": {"finished": True}})
+        store.apply({"op": "delete_task", "username": "u", "index": 1})
+
+    def test_mutations_append_and_replay(self):
+        store = JournalStore(self.path)
+        store.load()
+        self.populate(store)
+        self.assertFalse(os.path.exists(self.path))  # Nothing rewritten, only appended
+        accounts = JournalStore(self.path).load()
+        self.assertEqual(accounts["accounts"][0]["tasks"], [{"task": "a", "priority": False, "finished": True}])
+
+    def test_compaction_folds_journal_into_snapshot(self):
+        store = JournalStore(self.path, compact_threshold=200)
+        store.load()
+        self.populate(store)
+        self.assertTrue(os.path.exists(self.path))
+        self.assertLess(store.journal_size, 200)
+        accounts = JournalStore(self.path).load()
+        self.assertEqual(len(accounts["accounts"][0]["tasks"]), 1)
+
+    def test_torn_record_is_dropped(self):
+        store = JournalStore(self.path)
+        store.load()
+        self.populate(store)
+        with open(store.journal_path, "ab") as journal:
+            journal.write(b'{"op": "add_task", "usern')
+        store = JournalStore(self.path)
+        self.assertEqual(len(store.load()["accounts"][0]["tasks"]), 1)
+        store.apply({"op": "add_task", "username": "u", "task": {"task": "c", "priority": False, "finished": False}})
+        self.assertEqual(len(JournalStore(self.path).load()["accounts"][0]["tasks"]), 2)
+
+    def test_journal_older_than_snapshot_is_ignored(self):
+        # Crash after the snapshot was compacted but before the journal was reset
+        store = JournalStore(self.path)
+        store.load()
+        self.populate(store)
+        with open(store.journal_path, "rb") as journal:
+            stale_journal = journal.read()
+        store.compact()
+        with open(store.journal_path, "wb") as journal:
+            journal.write(stale_journal)
+        accounts = JournalStore(self.path).load()
+        self.assertEqual(len(accounts["accounts"]), 1)
+        self.assertEqual(len(accounts["accounts"][0]["tasks"]), 1)
+
+class TestShardedAccountStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "accounts.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_single_file_format_is_migrated(self):
+        old = {"accounts": [{"username": "a", "password_hash": "h", "tasks": [{"task": "t", "priority": True, "finished": False}]},
+                            {"username": "b", "password_hash": "h2", "tasks": []}]}
+        with open(self.path, "w") as f:
+            json.dump(old, f)
+        store = ShardedAccountStore(self.path)
+        accounts = store.load()
+        self.assertNotIn("tasks", accounts["accounts"][0])
+        with open(self.path) as f:
+            index = json.load(f)
+        self.assertEqual(index["format"], 2)
+        self.assertEqual([a["username"] for a in index["accounts"]], ["a", "b"])
+        self.assertEqual(ShardedAccountStore(self.path).load()["accounts"][0]["password_hash"], "h")
+        store = ShardedAccountStore(self.path)
+        store.load()
+        self.assertEqual(store.tasks("a"), old["accounts"][0]["tasks"])
+
+    def test_shards_are_loaded_lazily_and_saved_alone(self):
+        store = ShardedAccountStore(self.path)
+        store.load()
+        for name in ("a", "b"):
+            store.apply({"op": "create_account", "username": name, "password_hash": "h"})
+        store.apply({"op": "add_task", "username": "a", "task": {"task": "x", "priority": False, "finished": False}})
+        store.save_tasks("a")
+        shard_b = os.path.join(self.tmpdir.name, store._account_shard("b"))
+        self.assertFalse(os.path.exists(shard_b))  # Never touched
+
+        store = ShardedAccountStore(self.path)
+        store.load()
+        self.assertEqual(store.shards, {})
+        self.assertEqual(store.tasks("a")[0]["task"], "x")
+        self.assertEqual(list(store.shards), ["a"])
+
+    def test_username_index_tracks_create_and_delete(self):
+        store = ShardedAccountStore(self.path)
+        store.load()
+        for i in range(50):
+            store.apply({"op": "create_account", "username": "user%d" % i, "password_hash": "h%d" % i})
+        store.apply({"op": "delete_account", "username": "user10"})
+        self.assertIsNone(store.account("user10"))
+        self.assertEqual(store.account("user49")["password_hash"], "h49")
+        reloaded = ShardedAccountStore(self.path)
+        reloaded.load()
+        self.assertEqual(len(reloaded.by_username), 49)
+        self.assertIs(reloaded.account("user3"), reloaded.index.doc["accounts"][3])
+
+    def test_delete_account_removes_shard(self):
+        store = ShardedAccountStore(self.path)
+        store.load()
+        store.apply({"op": "create_account", "username": "a", "password_hash": "h"})
+        store.apply({"op": "add_task", "username": "a", "task": {"task": "x", "priority": False, "finished": False}})
+        shard = os.path.join(self.tmpdir.name, store._account_shard("a"))
+        store.apply({"op": "delete_account", "username": "a"})
+        self.assertFalse(os.path.exists(shard + ".journal"))
+        store.apply({"op": "create_account", "username": "a", "password_hash": "h"})
+        self.assertEqual(store.tasks("a"), [])
+
+class FakeRoot:
+    """Stands in for Tk's after()/after_cancel() so timers can be fired by hand."""
+    def __init__(self):
+        self.timers = {}
+        self.next_id = 0
+
+    def after(self, delay_ms, callback):
+        self.next_id += 1
+        self.timers[self.next_id] = (delay_ms, callback)
+        return self.next_id
+
+    def after_cancel(self, after_id):
+        del self.timers[after_id]
+
+    def fire(self):
+        for after_id, (delay_ms, callback) in list(self.timers.items()):
+            del self.timers[after_id]
+            callback()
+
+class TestWriteBehind(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "accounts.json")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_burst_is_coalesced_into_one_flush(self):
+        root = FakeRoot()
+        flushes = []
+        saver = WriteBehindSaver(root, lambda: flushes.append(1))
+        for _ in range(5):
+            saver.mark_dirty()
+        self.assertEqual(len(root.timers), 1)  # Each change re-arms the same timer
+        root.fire()
+        self.assertEqual(flushes, [1])
+        saver.flush()
+        self.assertEqual(flushes, [1])  # Nothing left to write
+
+    def test_buffered_store_writes_only_on_flush(self):
+        store = ShardedAccountStore(self.path, autoflush=False)
+        store.load()
+        saver = WriteBehindSaver(FakeRoot(), store.flush)
+        store.apply({"op": "create_account", "username": "a", "password_hash": "h"})
+        store.apply({"op": "add_task", "username": "a", "task": {"task": "x", "priority": False, "finished": False}})
+        saver.mark_dirty()
+        self.assertTrue(store.dirty)
+        self.assertEqual(ShardedAccountStore(self.path).load()["accounts"], [])
+        saver.flush()
+        self.assertFalse(store.dirty)
+        reloaded = ShardedAccountStore(self.path)
+        self.assertEqual(reloaded.load()["accounts"][0]["username"], "a")
+        self.assertEqual(reloaded.tasks("a")[0]["task"], "x")
+
+class FakeTk:
+    """Stands in for the Tcl interpreter behind a widget; records calls."""
+    def __init__(self):
+        self.called = []
+
+    def splitlist(self, command):
+        return tuple(command.split())
+
+    def call(self, *args):
+        self.called.append(args)
+
+class FakeListbox:
+    """Records the Listbox calls TaskListView makes, without a display."""
+    def __init__(self, yscrollcommand=""):
+        self.items = []
+        self.backgrounds = {}
+        self.selection = set()
+        self.calls = 0
+        self.options = {"yscrollcommand": yscrollcommand}
+        self.tk = FakeTk()
+
+    def configure(self, **options):
+        self.options.update(options)
+
+    def cget(self, option):
+        return self.options[option]
+
+    def size(self):
+        return len(self.items)
+
+    def insert(self, index, *texts):
+        self.calls += 1
+        index = len(self.items) if index == "end" else index
+        self.items[index:index] = list(texts)
+
+    def delete(self, first, last=None):
+        self.calls += 1
+        last = first if last is None else (len(self.items) - 1 if last == "end" else last)
+        del self.items[first:last + 1]
+
+    def itemconfig(self, index, **options):
+        self.backgrounds[self.items[index]] = options["bg"]
+
+    def curselection(self):
+        return tuple(sorted(self.selection))
+
+    def selection_clear(self, first, last=None):
+        self.selection.clear()
+
+    def selection_set(self, index):
+        self.selection.add(index)
+
+class TestTaskListView(unittest.TestCase):
+    def rows(self, names):
+        return [(name, name, "red" if name.startswith("!") else None) for name in names]
+
+    def test_only_changed_rows_are_touched(self):
+        listbox = FakeListbox()
+        view = TaskListView(listbox)
+        names = ["t%d" % i for i in range(100)]
+        view.set_rows(self.rows(names))
+        listbox.calls = 0
+        view.set_rows(self.rows(names[:50] + ["!new"] + names[50:]))
+        self.assertEqual(listbox.calls, 1)
+        self.assertEqual(listbox.items[50], "!new")
+        self.assertEqual(listbox.backgrounds["!new"], "red")
+        listbox.calls = 0
+        view.set_rows(self.rows(names[:10] + names[11:50] + ["!new"] + names[50:]))
+        self.assertEqual(listbox.calls, 1)
+        self.assertEqual(listbox.items, names[:10] + names[11:50] + ["!new"] + names[50:])
+
+    def test_large_lists_render_lazily(self):
+        listbox = FakeListbox()
+        view = TaskListView(listbox, page_size=50)
+        view.set_rows(self.rows(["t%d" % i for i in range(1000)]))
+        self.assertEqual(listbox.size(), 50)
+        view._on_scroll("0.5", "0.95")  # Scrolled near the end of what is rendered
+        self.assertEqual(listbox.size(), 100)
+        self.assertEqual(listbox.items[99], "t99")
+
+    def test_selection_follows_key(self):
+        listbox = FakeListbox()
+        view = TaskListView(listbox)
+        view.set_rows([(1, "a", None), (2, "b", None), (3, "c", None)])
+        listbox.selection_set(1)
+        view.set_rows([(1, "a", None), (4, "new", None), (2, "b [Finished]", None), (3, "c", None)])
+        self.assertEqual(listbox.curselection(), (2,))
+
+    def test_rows_are_requested_at_the_end(self):
+        listbox = FakeListbox()
+        pages = [self.rows(["t%d" % i for i in range(start, start + 50)]) for start in (50, 100)]
+        view = TaskListView(listbox, page_size=50, on_end=lambda: pages and view.extend_rows(pages.pop(0)))
+        view.set_rows(self.rows(["t%d" % i for i in range(50)]))
+        view._on_scroll("0.0", "0.5")
+        self.assertEqual(len(pages), 2)
+        view._on_scroll("0.5", "0.95")
+        self.assertEqual(listbox.size(), 100)
+        self.assertEqual(listbox.items[99], "t99")
+        view._on_scroll("0.5", "0.95")
+        view._on_scroll("0.5", "0.95")
+        self.assertEqual(listbox.size(), 150)
+
+    def test_selected_keys_span_a_multi_selection(self):
+        listbox = FakeListbox()
+        view = TaskListView(listbox)
+        view.set_rows([(1, "a", None), (2, "b", None), (3, "c", None)])
+        listbox.selection_set(2)
+        listbox.selection_set(0)
+        self.assertEqual(view.selected_keys(), [1, 3])
+        view.set_rows([(3, "c", None), (1, "a [Finished]", None)])
+        self.assertEqual(view.selected_keys(), [3, 1])
+
+    def test_existing_scroll_command_is_chained(self):
+        listbox = FakeListbox(yscrollcommand=".scrollbar set")
+        view = TaskListView(listbox, page_size=50)
+        view.set_rows(self.rows(["t%d" % i for i in range(100)]))
+        listbox.options["yscrollcommand"]("0.5", "0.95")
+        self.assertEqual(listbox.tk.called, [(".scrollbar", "set", "0.5", "0.95")])
+        self.assertEqual(listbox.size(), 100)
+
+class TestTaskModel(unittest.TestCase):
+    def test_record_behaves_like_the_dict(self):
+        record = TaskRecord.from_dict({"task": "Buy milk", "priority": True, "finished": False, "note": "x"})
+        self.assertEqual(record, {"task": "Buy milk", "priority": True, "finished": False, "note": "x"})
+        record.update({"finished": True, "priority": False})
+        self.assertEqual((record["priority"], record["finished"]), (False, True))
+        self.assertFalse(hasattr(record, "__dict__"))
+        with self.assertRaises(KeyError):
+            record["missing"]
+
+    def test_uid_is_stable_and_never_reused(self):
+        record = TaskRecord("a")
+        uid = record.uid
+        record.update({"task": "b", "finished": True})
+        self.assertEqual(record.uid, uid)
+        del record
+        self.assertNotIn(uid, [TaskRecord("a").uid for _ in range(100)])
+
+    def test_store_keeps_records(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "accounts.json")
+            store = ShardedAccountStore(path)
+            store.load()
+            store.apply({"op": "create_account", "username": "u", "password_hash": "x"})
+            store.apply({"op": "add_task", "username": "u", "task": {"task": "a", "priority": False, "finished": False}})
+            task = store.tasks("u")[0]
+            self.assertIsInstance(task, TaskRecord)
+            store.apply({"op": "update_task", "username": "u", "index": 0, "fields": {"finished": True}})
+            self.assertIs(store.tasks("u")[0], task)
+            store.save_tasks("u")
+            reloaded = ShardedAccountStore(path)
+            reloaded.load()
+            self.assertIsInstance(reloaded.tasks("u")[0], TaskRecord)
+            self.assertEqual(reloaded.tasks("u"), [{"task": "a", "priority": False, "finished": True}])
+
+    def test_records_take_less_memory(self):
+        # Repeated texts, as in recurring tasks, are stored once
+        data = json.dumps([{"task": "Water the plants", "priority": i % 2 == 0, "finished": False} for i in range(2000)])
+        self.assertLess(measure(lambda: compact_tasks(json.loads(data))), measure(lambda: json.loads(data)) * 0.5)
+
+class TestTrigramIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TrigramIndex([(1, "Buy milk"), (2, "Call the plumber"), (3, "Milkshake recipe"), (4, "go")])
+
+    def test_substring_and_prefix(self):
+        self.assertEqual(self.index.search("MILK"), {1, 3})
+        self.assertEqual(self.index.search("umb"), {2})
+        self.assertEqual(self.index.search("ilk", prefix=True), set())
+        self.assertEqual(self.index.search("the", prefix=True), {2})
+        self.assertEqual(self.index.search("nothing"), set())
+
+    def test_short_queries(self):
+        self.assertEqual(self.index.search("go"), {4})
+        self.assertEqual(self.index.search(""), {1, 2, 3, 4})
+
+    def test_incremental_updates(self):
+        self.index.update(1, "Buy bread")
+        self.index.remove(3)
+        self.index.add(5, "milk the cow")
+        self.assertEqual(self.index.search("milk"), {5})
+        self.assertEqual(self.index.search("bread"), {1})
+        self.assertEqual(len(self.index), 4)
+        self.assertNotIn("mil", {gram for gram, keys in self.index.postings.items() if 3 in keys})
+
+    def test_custom_normalize(self):
+        casefold = TrigramIndex([(1, "Straße"), (2, "Strasse")], normalize=str.casefold)
+        self.assertEqual(casefold.search("STRASSE"), {1, 2})
+        self.assertEqual(TrigramIndex([(1, "Straße")]).search("STRASSE"), set())
+
+class TestSqliteSearch(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        test_app.initialize_db(self.conn)
+        with self.conn:
+            self.conn.executemany("INSERT INTO accounts VALUES (?, 'x')", [("bob",), ("bob smith",), ("!!!",)])
+            self.conn.executemany("INSERT INTO tasks (username, task, priority, finished) VALUES (?, ?, ?, ?)", [
+                ("bob", "Buy milk", 0, 0),
+                ("bob", "Milk milk milk", 1, 1),
+                ("bob", "Call the plumber", 1, 0),
+                ("bob smith", "Buy milk too", 0, 0),
+                ("!!!", "milk", 0, 0),
+            ])
+
+    def search(self, *args, **kwargs):
+        return [row[1] for row in test_app.search_tasks(self.conn, *args, **kwargs)]
+
+    def test_ranked_and_filtered(self):
+        self.assertEqual(self.search("bob", "milk"), ["Milk milk milk", "Buy milk"])
+        self.assertEqual(self.search("bob", "mil", finished=False), ["Buy milk"])
+        self.assertEqual(self.search("bob", "milk", priority=True), ["Milk milk milk"])
+        self.assertEqual(self.search("!!!", "MILK"), ["milk"])
+        self.assertEqual(self.search("bob", 'milk" OR "plumber'), [])  # Never parsed as query syntax
+
+    def test_keyword_matches_as_a_substring(self):
+        with self.conn:
+            self.conn.execute("INSERT INTO tasks (username, task, priority, finished) VALUES ('bob', 'Buttermilk', 0, 0)")
+        self.assertEqual(sorted(self.search("bob", "milk")), ["Buttermilk", "Buy milk", "Milk milk milk"])
+        self.assertEqual(self.search("bob", "ttermi"), ["Buttermilk"])
+        self.assertEqual(self.search("bob", "the plum"), ["Call the plumber"])
+        self.assertEqual(self.search("bob", "plumb call"), [])  # The whole keyword, not each word
+        self.assertEqual(self.search("bob", "Mi", finished=False), ["Buy milk", "Buttermilk"])  # Too short for a trigram
+        self.assertEqual(self.search("bob", "%"), [])
+
+    def test_word_index_is_rebuilt_as_trigrams(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE accounts (username TEXT PRIMARY KEY, password_hash TEXT)")
+        conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY, username TEXT, task TEXT, priority INTEGER, finished INTEGER)")
+        conn.execute("CREATE VIRTUAL TABLE tasks_fts USING fts5(task, username, content='tasks', content_rowid='id')")
+        conn.execute("INSERT INTO tasks (username, task, priority, finished) VALUES ('bob', 'Buttermilk', 0, 0)")
+        test_app.initialize_db(conn)
+        self.assertEqual(len(test_app.search_tasks(conn, "bob", "milk")), 1)
+
+    def test_paging(self):
+        self.assertEqual(self.search("bob", "milk", limit=1, offset=1), ["Buy milk"])
+
+    def test_index_follows_changes(self):
+        with self.conn:
+            self.conn.execute("UPDATE tasks SET task='Buy bread' WHERE task='Buy milk'")
+            self.conn.execute("DELETE FROM tasks WHERE task='Call the plumber'")
+        self.assertEqual(self.search("bob", "milk"), ["Milk milk milk"])
+        self.assertEqual(self.search("bob", "bread"), ["Buy bread"])
+        self.assertEqual(self.search("bob", "plumber"), [])
+
+    def test_existing_tasks_are_indexed(self):
+        conn = sqlite3.connect(":memory:")
+        conn.execute("CREATE TABLE accounts (username TEXT PRIMARY KEY, password_hash TEXT)")
+        conn.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY, username TEXT, task TEXT, priority INTEGER, finished INTEGER)")
+        conn.execute("INSERT INTO tasks (username, task, priority, finished) VALUES ('bob', 'Old task', 0, 0)")
+        test_app.initialize_db(conn)
+        self.assertEqual(len(test_app.search_tasks(conn, "bob", "old")), 1)
+
+    def test_partial_update_writes_only_given_columns(self):
+        task_id = self.conn.execute("SELECT id FROM tasks WHERE task='Buy milk'").fetchone()[0]
+        self.assertTrue(test_app.update_task(self.conn, "bob", task_id, finished=True))
+        self.assertEqual(self.conn.execute("SELECT task, priority, finished FROM tasks WHERE id=?", (task_id,)).fetchone(),
+                         ("Buy milk", 0, 1))
+        self.assertTrue(test_app.update_task(self.conn, "bob", task_id, task="Buy oat milk"))
+        self.assertEqual(self.search("bob", "oat"), ["Buy oat milk"])
+        self.assertFalse(test_app.update_task(self.conn, "bob smith", task_id, finished=False))
+        with self.assertRaises(ValueError):
+            test_app.update_task(self.conn, "bob", task_id, owner="bob smith")
+
+class TestPasswords(unittest.TestCase):
+    def setUp(self):
+        self.old_rounds = passwords.BCRYPT_ROUNDS
+        passwords.BCRYPT_ROUNDS = 4
+
+    def tearDown(self):
+        passwords.BCRYPT_ROUNDS = self.old_rounds
+
+    def test_rehash_only_when_cost_differs(self):
+        password_hash = passwords.hash_password("secret")
+        self.assertEqual(passwords.check_password("secret", password_hash), (True, None))
+        self.assertEqual(passwords.check_password("wrong", password_hash.decode()), (False, None))
+        passwords.BCRYPT_ROUNDS = 5
+        matches, new_hash = passwords.check_password("secret", password_hash.decode())
+        self.assertTrue(matches)
+        self.assertEqual(passwords.hash_rounds(new_hash), 5)
+
+    def test_calibrate_stops_past_target(self):
+        timings, best = passwords.calibrate(target_ms=0, min_rounds=4, max_rounds=8)
+        self.assertEqual(best, 4)
+        self.assertEqual(len(timings), 1)
+        timings, best = passwords.calibrate(target_ms=10 ** 6, min_rounds=4, max_rounds=6)
+        self.assertEqual((best, [rounds for rounds, _ in timings]), (6, [4, 5, 6]))
+
+    def test_store_upgrades_hash(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "accounts.json")
+            store = ShardedAccountStore(path)
+            store.load()
+            store.apply({"op": "create_account", "username": "bob", "password_hash": "old"})
+            store.apply({"op": "set_password_hash", "username": "bob", "password_hash": "new"})
+            self.assertEqual(store.account("bob")["password_hash"], "new")
+            store = ShardedAccountStore(path)
+            store.load()
+            self.assertEqual(store.account("bob")["password_hash"], "new")
+
+class TaskServiceChecks:
+    """Backend-independent TaskService tests; subclasses provide make_backend()."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.old_rounds = passwords.BCRYPT_ROUNDS
+        passwords.BCRYPT_ROUNDS = 4
+        self.backend = self.make_backend()
+        self.assertTrue(self.backend.create_account("bob", "secret"))
+        self.assertFalse(self.backend.create_account("bob", "other"))
+
+    def tearDown(self):
+        self.backend.close()
+        passwords.BCRYPT_ROUNDS = self.old_rounds
+        self.tmpdir.cleanup()
+
+    def test_login(self):
+        self.assertIsNone(TaskService.login(self.backend, "bob", "wrong"))
+        self.assertIsNone(TaskService.login(self.backend, "nobody", "secret"))
+        self.assertIsNotNone(TaskService.login(self.backend, "bob", "secret"))
+
+    def test_batch_operations(self):
+        service = TaskService.login(self.backend, "bob", "secret")
+        ids = service.add_many([("a", True, False), ("b", False, False), ("c", False, True)])
+        self.assertEqual([task.id for task in service.tasks()], ids)
+        service.complete_many(ids[:2])
+        service.complete(ids[2], finished=False)
+        service.edit(ids[1], "b2", True)
+        service.prioritize_many(ids[1:], False)
+        self.assertEqual([(task.text, bool(task.priority), bool(task.finished)) for task in service.tasks()],
+                         [("a", True, True), ("b2", False, True), ("c", False, False)])
+        self.assertEqual([task.text for task in service.search("B2")], ["b2"])
+        service.delete_many([ids[0], ids[2]])
+        self.assertEqual([task.text for task in service.tasks()], ["b2"])
+        service.delete_account()
+        self.assertIsNone(TaskService.login(self.backend, "bob", "secret"))
+
+class TestJsonTaskService(TaskServiceChecks, unittest.TestCase):
+    def make_backend(self):
+        return JsonBackend(os.path.join(self.tmpdir.name, "accounts.json"))
+
+    def test_changes_are_written(self):
+        service = TaskService.login(self.backend, "bob", "secret")
+        service.add_many([("a", False, False), ("b", False, False)])
+        backend = JsonBackend(os.path.join(self.tmpdir.name, "accounts.json"))
+        self.assertEqual([task.text for task in backend.tasks("bob")], ["a", "b"])
+
+    def test_search_index_is_kept_current(self):
+        service = TaskService.login(self.backend, "bob", "secret")
+        ids = service.add_many([("Buy milk", False, False), ("Call Bob", False, False)])
+        index = self.backend.search_index("bob")
+        self.assertEqual([task.text for task in service.search("milk")], ["Buy milk"])
+        service.add_many([("Buttermilk", False, False)])
+        service.edit(ids[1], "Milk the cow", False)
+        service.delete_many([ids[0]])
+        self.assertEqual([task.text for task in service.search("MILK")], ["Milk the cow", "Buttermilk"])
+        self.assertIs(self.backend.search_index("bob"), index)
+        self.assertEqual(len(index), 2)
+
+class TestSqliteTaskService(TaskServiceChecks, unittest.TestCase):
+    def make_backend(self):
+        return SqliteBackend(os.path.join(self.tmpdir.name, "todo_app.db"))
+
+class TestEncryptedTaskService(TaskServiceChecks, unittest.TestCase):
+    def make_backend(self):
+        return EncryptedBackend(os.path.join(self.tmpdir.name, "encrypted.db"))
+
+    def test_backend_leaves_imports_and_shared_database_alone(self):
+        path = list(sys.path)
+        EncryptedBackend(os.path.join(self.tmpdir.name, "other.db")).close()
+        self.assertEqual(sys.path, path)
+        self.assertIs(self.backend.database, taskservice.import_app_module(taskservice.ENCRYPTED_APP_DIR, "database"))
+        self.assertEqual(self.backend.database.__name__, "baba_database")
+        self.assertEqual(self.backend.database.DATABASE_NAME, "todo_app.db")
+        self.assertIsNot(self.backend.database.get_database(), self.backend.db)
+
+class TestBenchSuite(unittest.TestCase):
+    def test_case_records_every_phase(self):
+        old_rounds = passwords.BCRYPT_ROUNDS
+        try:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                metrics = benchsuite.run_case("sqlite", 10, 3, 2, 4, tmpdir)
+        finally:
+            passwords.BCRYPT_ROUNDS = old_rounds
+        self.assertEqual(sorted(metrics), sorted(benchsuite.PHASES))
+        self.assertGreater(metrics["seed"]["ms"], 0)
+
+    def test_compare_flags_only_real_slowdowns(self):
+        def results(**phases):
+            return {"results": [{"backend": "json", "tasks": 10,
+                                 "metrics": {phase: {"ms": ms} for phase, ms in phases.items()}}]}
+        baseline = results(login=100.0, add=0.1)
+        self.assertEqual(benchsuite.compare(results(login=120.0, add=0.9), baseline, 1.5, 5.0), [])
+        self.assertEqual(len(benchsuite.compare(results(login=200.0, add=0.1), baseline, 1.5, 5.0)), 1)
+
+class TestWorkload(unittest.TestCase):
+    def test_generation_is_seeded(self):
+        first = list(workload.generate_accounts(7, 20, 50))
+        self.assertEqual(first, list(workload.generate_accounts(7, 20, 50)))
+        self.assertNotEqual(first, list(workload.generate_accounts(8, 20, 50)))
+        tasks = [task for _, account_tasks in first for task in account_tasks]
+        self.assertTrue(any(not text.isascii() for text, _, _ in tasks))
+        self.assertTrue(0.1 < sum(finished for _, _, finished in tasks) / len(tasks) < 0.5)
+        self.assertEqual(list(workload.generate_trace(3, 5, 20)), list(workload.generate_trace(3, 5, 20)))
+
+    def test_generate_and_replay(self):
+        self.addCleanup(setattr, passwords, "BCRYPT_ROUNDS", passwords.BCRYPT_ROUNDS)
+        passwords.BCRYPT_ROUNDS = workload.SEED_ROUNDS  # No rehash on login
+        accounts = list(workload.generate_accounts(1, 3, 20))
+        trace = list(workload.generate_trace(2, 3, 200))
+        for target in ("json", "sqlite"):
+            with tempfile.TemporaryDirectory() as tmpdir:
+                path = os.path.join(tmpdir, "store")
+                count = workload.WRITERS[target](path, accounts)
+                backend = workload.BACKENDS[target](path)
+                service = TaskService.login(backend, "user1", workload.PASSWORD)
+                self.assertEqual([task.text for task in service.tasks()], [task[0] for task in accounts[1][1]])
+                latencies = workload.replay(backend, trace)
+                self.assertEqual(sum(len(values) for values in latencies.values()), 200)
+                self.assertGreaterEqual(sum(len(backend.tasks(name)) for name, _ in accounts),
+                                        count - len(latencies["delete"]))
+                backend.close()
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.was_enabled, self.old_slow_ms = tracing.enabled(), tracing.slow_ms
+        tracing.reset()
+
+    def tearDown(self):
+        tracing.enable(self.old_slow_ms)
+        if not self.was_enabled:
+            tracing.disable()
+        tracing.reset()
+
+    def test_disabled_records_nothing(self):
+        tracing.disable()
+        with tracing.span("outer") as span:
+            span.set(rows=1)
+        tracing.count("rows", 5)
+        self.assertEqual((len(tracing.spans), dict(tracing.counters)), (0, {}))
+
+    def test_record_starts_at_an_earlier_reading(self):
+        tracing.enable(slow_threshold_ms=10 ** 6)
+        tracing.record("ui.first_paint", time.perf_counter() - 0.5, rows=3)
+        [span] = tracing.spans
+        self.assertEqual((span["name"], span["rows"]), ("ui.first_paint", 3))
+        self.assertGreaterEqual(span["ms"], 500)
+        tracing.disable()
+        tracing.record("ui.first_paint", time.perf_counter())
+        self.assertEqual(len(tracing.spans), 1)
+
+    def test_nested_spans_counters_and_slow_log(self):
+        tracing.enable(slow_threshold_ms=10 ** 6)
+
+        @tracing.traced("inner")
+        def inner():
+            tracing.count("rows", 2)
+
+        with tracing.span("outer", user="bob") as span:
+            inner()
+            inner()
+            span.set(rows=4)
+        self.assertEqual([(s["name"], s["parent"], s["depth"]) for s in tracing.spans],
+                         [("inner", "outer", 1), ("inner", "outer", 1), ("outer", None, 0)])
+        self.assertEqual((tracing.spans[-1]["user"], tracing.spans[-1]["rows"]), ("bob", 4))
+        self.assertEqual(tracing.counters["rows"], 4)
+        self.assertEqual(tracing.summary()["inner"]["calls"], 2)
+        self.assertEqual(len(tracing.slow), 0)
+        tracing.enable(slow_threshold_ms=0)
+        with self.assertRaises(KeyError):
+            with tracing.span("failing"):
+                raise KeyError
+        self.assertEqual(tracing.slow[-1]["error"], "KeyError")
+
+    def test_export_and_profile(self):
+        tracing.enable()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tracing.start_profile(os.path.join(tmpdir, "run.pstats"))
+            with tracing.span("work"):
+                sum(range(1000))
+            path = tracing.stop_profile()
+            self.assertGreater(pstats.Stats(path).total_calls, 0)
+            with open(tracing.export_json(os.path.join(tmpdir, "trace.json"))) as f:
+                data = json.load(f)
+        self.assertEqual(data["spans"][0]["name"], "work")
+        self.assertIn("work", data["summary"])
+
+if __name__ == '__main__':
+    unittest.main()
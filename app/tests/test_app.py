@@ -1,28 +1,143 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
 import sqlite3
-import bcrypt
 import os
+import sys
 
-DATABASE_NAME = "todo_app.db"
+# Password hashing is shared with the other apps and lives in app/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from passwords import hash_password, check_password
 
-def initialize_db():
+DATABASE_NAME = "todo_app.db"
+# Search results fetched per page
+SEARCH_PAGE_SIZE = 100
+
+def connect_db(path=None):
+    """Open a long-lived connection tuned for many small transactions."""
+    conn = sqlite3.connect(path or DATABASE_NAME, cached_statements=128)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-16000")
+    conn.execute("PRAGMA mmap_size=67108864")
+    return conn
+
+def initialize_db(conn=None):
     """Create or open a database and create tables if they don't exist."""
-    conn = sqlite3.connect(DATABASE_NAME)
+    own_connection = conn is None
+    if own_connection:
+        conn = sqlite3.connect(DATABASE_NAME)
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS accounts
                  (username TEXT PRIMARY KEY, password_hash TEXT)''')
     c.execute('''CREATE TABLE IF NOT EXISTS tasks
                  (id INTEGER PRIMARY KEY, username TEXT, task TEXT, priority INTEGER, finished INTEGER,
                   FOREIGN KEY(username) REFERENCES accounts(username))''')
+    initialize_search(c)
     conn.commit()
-    conn.close()
+    if own_connection:
+        conn.close()
+
+def initialize_search(c):
+    """
+    Create the full-text index over tasks. It is an external-content FTS5
+    table, so the text is stored once in tasks and triggers keep the index in
+    step with every insert, update and delete. The trigram tokenizer lets it
+    answer substring searches, as the filter did before there was an index.
+    """
+    c.execute("SELECT sql FROM sqlite_master WHERE type='table' AND name='tasks_fts'")
+    row = c.fetchone()
+    exists = row is not None and "trigram" in row[0]
+    if row is not None and not exists:
+        # Indexed by words in an earlier version, which only matched word prefixes
+        c.execute("DROP TABLE tasks_fts")
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts
+                 USING fts5(task, username, content='tasks', content_rowid='id', tokenize='trigram')''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+                   INSERT INTO tasks_fts(rowid, task, username) VALUES (new.id, new.task, new.username);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+                   INSERT INTO tasks_fts(tasks_fts, rowid, task, username) VALUES ('delete', old.id, old.task, old.username);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF task, username ON tasks BEGIN
+                   INSERT INTO tasks_fts(tasks_fts, rowid, task, username) VALUES ('delete', old.id, old.task, old.username);
+                   INSERT INTO tasks_fts(rowid, task, username) VALUES (new.id, new.task, new.username);
+                 END''')
+    if not exists:
+        # Index the tasks of a database created before the search table
+        c.execute("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+def _match_phrase(text):
+    # Quote as an FTS5 string so user input is never parsed as query syntax
+    return '"' + text.replace('"', '""') + '"'
+
+def _like_pattern(text):
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def search_tasks(conn, username, keyword, priority=None, finished=None, limit=SEARCH_PAGE_SIZE, offset=0):
+    """
+    Return one page of (id, task, priority, finished) rows of a user whose text
+    contains keyword, case-insensitively, best bm25 match first. Keywords
+    shorter than a trigram cannot use the index; they are matched with LIKE
+    over the user's tasks, oldest first. priority and finished, when not
+    None, restrict the results further.
+    """
+    if not keyword:
+        return []
+    if len(keyword) < 3:
+        sql = '''SELECT t.id, t.task, t.priority, t.finished FROM tasks t
+                 WHERE t.task LIKE ? ESCAPE '\\' AND t.username = ?'''
+        params = [_like_pattern(keyword), username]
+        order = "t.id"
+    else:
+        query = "task : %s" % _match_phrase(keyword)
+        if len(username) >= 3:
+            # Narrows the match to the user's rows inside the index; t.username below makes it exact
+            query = "username : %s AND %s" % (_match_phrase(username), query)
+        sql = '''SELECT t.id, t.task, t.priority, t.finished FROM tasks_fts
+                 JOIN tasks t ON t.id = tasks_fts.rowid
+                 WHERE tasks_fts MATCH ? AND t.username = ?'''
+        params = [query, username]
+        order = "bm25(tasks_fts)"
+    if priority is not None:
+        sql += " AND t.priority = ?"
+        params.append(int(priority))
+    if finished is not None:
+        sql += " AND t.finished = ?"
+        params.append(int(finished))
+    sql += " ORDER BY %s LIMIT ? OFFSET ?" % order
+    params += [limit, offset]
+    return conn.execute(sql, params).fetchall()
+
+TASK_COLUMNS = ("task", "priority", "finished")
+
+def update_task(conn, username, task_id, **fields):
+    """
+    Write only the given columns (task, priority, finished) of one task, in
+    one UPDATE by primary key. Returns False if the user has no such task.
+    """
+    unknown = set(fields) - set(TASK_COLUMNS)
+    if unknown:
+        raise ValueError("unknown task columns: " + ", ".join(sorted(unknown)))
+    if not fields:
+        return False
+    columns = [column for column in TASK_COLUMNS if column in fields]
+    params = [fields[column] if column == "task" else int(fields[column]) for column in columns]
+    with conn:
+        cursor = conn.execute("UPDATE tasks SET " + ", ".join(column + "=?" for column in columns) +
+                              " WHERE id=? AND username=?", params + [task_id, username])
+    return cursor.rowcount > 0
+
+def task_text(task, priority, finished):
+    """The listbox line of a task."""
+    return task + (" [Priority]" if priority else "") + (" [Finished]" if finished else "")
 
 class TodoAppGUI:
     def __init__(self, root):
         self.root = root
-        
-        initialize_db()  # Ensure the database and tables are initialized
+
+        # One connection for the whole session instead of one per click
+        self.conn = connect_db()
+        initialize_db(self.conn)  # Ensure the database and tables are initialized
 
         # Initialize task_listbox
         self.task_listbox = None
@@ -76,109 +191,114 @@ class TodoAppGUI:
     def login(self):
         """Handle user login."""
         username = self.username_entry.get()
-        password = self.password_entry.get().encode('utf-8')
+        password = self.password_entry.get()
 
-        conn = sqlite3.connect(DATABASE_NAME)
-        c = conn.cursor()
+        c = self.conn.cursor()
         c.execute("SELECT password_hash FROM accounts WHERE username=?", (username,))
         account = c.fetchone()
-        
-        if account and bcrypt.checkpw(password, account[0]):  # Directly use account[0] which is already a bytes object
+        matches, new_hash = check_password(password, account[0]) if account else (False, None)
+        if new_hash is not None:
+            # Stored with an outdated cost; upgrade it now that we know the password
+            with self.conn:
+                self.conn.execute("UPDATE accounts SET password_hash=? WHERE username=?", (new_hash, username))
+
+        if matches:
             messagebox.showinfo("Login Successful", "Welcome, " + username + "!")
             self.username = username
             self.login_window.destroy()
             self.init_main_app(username)
-            self.load_tasks()
         else:
             messagebox.showerror("Login Failed", "Incorrect username or password.")
-        conn.close()
 
     def load_tasks(self):
         """Load tasks for the logged-in user."""
         self.task_listbox.delete(0, tk.END)  # Clear the listbox
-        conn = sqlite3.connect(DATABASE_NAME)
-        c = conn.cursor()
-        c.execute("SELECT task, priority, finished FROM tasks WHERE username=?", (self.username,))
+        self.task_ids = []  # Row id of every listbox line, in the same order
+        c = self.conn.cursor()
+        c.execute("SELECT id, task, priority, finished FROM tasks WHERE username=? ORDER BY id", (self.username,))
         for task in c.fetchall():
-            task_text = task[0] + (" [Priority]" if task[1] else "") + (" [Finished]" if task[2] else "")
-            self.task_listbox.insert(tk.END, task_text)
-        conn.close()
+            self.show_task(tk.END, task)
+
+    def show_task(self, index, task):
+        """Insert an (id, task, priority, finished) row as the listbox line at index."""
+        self.task_listbox.insert(index, task_text(*task[1:]))
+        if task[2]:
+            self.task_listbox.itemconfig(index, bg="red")  # Highlight priority tasks
+        if index == tk.END:
+            self.task_ids.append(task[0])
+        else:
+            self.task_ids.insert(index, task[0])
+
+    def refresh_task(self, index):
+        """Redraw one listbox line from its row instead of reloading the list."""
+        task_id = self.task_ids.pop(index)
+        self.task_listbox.delete(index)
+        row = self.conn.execute("SELECT id, task, priority, finished FROM tasks WHERE id=? AND username=?",
+                                (task_id, self.username)).fetchone()
+        if row is not None:
+            self.show_task(index, row)
+            self.task_listbox.selection_set(index)
+
+    def selected_task(self):
+        """Return (listbox index, row id) of the selected task, or None after reporting it."""
+        selection = self.task_listbox.curselection()
+        if not selection:
+            messagebox.showerror("Error", "No task selected.")
+            return None
+        return selection[0], self.task_ids[selection[0]]
 
     def create_account(self, username, password):
         """Create a new user account with the given username and password."""
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        hashed_password = hash_password(password)
         try:
-            conn = sqlite3.connect(DATABASE_NAME)
-            c = conn.cursor()
-            c.execute("INSERT INTO accounts (username, password_hash) VALUES (?, ?)", (username, hashed_password))
-            conn.commit()
+            with self.conn:
+                self.conn.execute("INSERT INTO accounts (username, password_hash) VALUES (?, ?)", (username, hashed_password))
         except sqlite3.IntegrityError:
             messagebox.showerror("Error", "Username already exists.")
         else:
             messagebox.showinfo("Success", "Account created successfully.")
-        finally:
-            conn.close()
 
     def add_task(self):
         """Add a new task for the logged-in user."""
         task = simpledialog.askstring("Add Task", "Task description:")
         if task:  # Check if the task is not empty
             priority = int(self.priority_var.get())
-            conn = sqlite3.connect(DATABASE_NAME)
-            c = conn.cursor()
-            c.execute("INSERT INTO tasks (username, task, priority, finished) VALUES (?, ?, ?, 0)",
-                      (self.username, task, priority))
-            conn.commit()
-            conn.close()
-            self.load_tasks()  # Refresh the task list
+            with self.conn:
+                cursor = self.conn.execute("INSERT INTO tasks (username, task, priority, finished) VALUES (?, ?, ?, 0)",
+                                           (self.username, task, priority))
+            self.show_task(tk.END, (cursor.lastrowid, task, priority, 0))
 
     def edit_task(self):
         """Edit the selected task."""
-        selection = self.task_listbox.curselection()
-        if not selection:
-            messagebox.showerror("Error", "No task selected.")
+        selected = self.selected_task()
+        if selected is None:
             return
-        # For simplicity, assume task ID matches listbox index + 1
-        # This is a simplification; in a real application, you'd track task IDs separately
-        task_id = selection[0] + 1
+        index, task_id = selected
         new_task = simpledialog.askstring("Edit Task", "New task description:")
         if new_task:
-            conn = sqlite3.connect(DATABASE_NAME)
-            c = conn.cursor()
-            c.execute("UPDATE tasks SET task=? WHERE id=? AND username=?", (new_task, task_id, self.username))
-            conn.commit()
-            conn.close()
-            self.load_tasks()
+            update_task(self.conn, self.username, task_id, task=new_task)
+            self.refresh_task(index)
 
     def delete_task(self):
         """Delete the selected task."""
-        selection = self.task_listbox.curselection()
-        if not selection:
-            messagebox.showerror("Error", "No task selected.")
+        selected = self.selected_task()
+        if selected is None:
             return
-        # Similarly, simplifying task identification
-        task_id = selection[0] + 1
-        conn = sqlite3.connect(DATABASE_NAME)
-        c = conn.cursor()
-        c.execute("DELETE FROM tasks WHERE id=? AND username=?", (task_id, self.username))
-        conn.commit()
-        conn.close()
-        self.load_tasks()
+        index, task_id = selected
+        with self.conn:
+            self.conn.execute("DELETE FROM tasks WHERE id=? AND username=?", (task_id, self.username))
+        self.task_listbox.delete(index)
+        del self.task_ids[index]
 
     def complete_task(self):
         """Mark the selected task as completed."""
-        selection = self.task_listbox.curselection()
-        if not selection:
-            messagebox.showerror("Error", "No task selected.")
+        selected = self.selected_task()
+        if selected is None:
             return
-        task_id = selection[0] + 1
-        conn = sqlite3.connect(DATABASE_NAME)
-        c = conn.cursor()
-        c.execute("UPDATE tasks SET finished=1 WHERE id=? AND username=?", (task_id, self.username))
-        conn.commit()
-        conn.close()
-        self.load_tasks()
-        
+        index, task_id = selected
+        update_task(self.conn, self.username, task_id, finished=True)
+        self.refresh_task(index)
+
     def delete_account(self, username, password):
         for i, account in enumerate(self.accounts["accounts"]):
             if self.authenticate(account["username"], password):
@@ -194,7 +314,6 @@ class TodoAppGUI:
         self.root.geometry("800x700")
         self.root.resizable(True, True)
         self.username = username
-        self.load_tasks()  # Load user-specific tasks
 
         # Main application window
         self.task_entry = tk.Entry(self.root, font=("Arial", 12))
@@ -206,6 +325,13 @@ class TodoAppGUI:
         search_entry.pack(pady=5, padx=50, fill='both', expand=True)
         filter_button = ttk.Button(self.root, text="Filter", command=self.filter_tasks)
         filter_button.pack(pady=5, padx=50, fill='both', expand=True)
+        self.priority_only_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.root, text="Priority only", variable=self.priority_only_var, font=("Arial", 12)).pack(pady=5, padx=10)
+        self.hide_finished_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(self.root, text="Hide finished", variable=self.hide_finished_var, font=("Arial", 12)).pack(pady=5, padx=10)
+        self.more_button = ttk.Button(self.root, text="More Results", command=lambda: self.filter_tasks(more=True))
+        self.more_button.pack(pady=5, padx=50, fill='both', expand=True)
+        self.search_offset = 0
 
         ttk.Style().configure("Add.TButton", font=("Arial", 12))
         self.add_button = ttk.Button(self.root, text="Add Task", style="Add.TButton", command=self.add_task)
@@ -213,7 +339,7 @@ class TodoAppGUI:
 
         self.priority_var = tk.BooleanVar()
         self.priority_var.set(False)
-        tk.Checkbutton(self.root, text="Priority", variable=self.priority_var, font=("Arial", 12), command=self.update_task_list).pack(pady=5, padx=10)
+        tk.Checkbutton(self.root, text="Priority", variable=self.priority_var, font=("Arial", 12)).pack(pady=5, padx=10)
 
         self.task_listbox = tk.Listbox(self.root, font=("Arial", 12))
         self.task_listbox.pack(pady=5, padx=50, fill='both', expand=1)
@@ -229,17 +355,27 @@ class TodoAppGUI:
         self.delete_button = ttk.Button(self.root, text="Delete Task", style="Delete.TButton", command=self.delete_task)
         self.delete_button.pack(pady=5, padx=50, fill='both', expand=True)  # Pack the delete button into the window
 
-        self.update_task_list()
+        self.load_tasks()  # Load user-specific tasks once the listbox exists
 
-    def filter_tasks(self):
-        keyword = self.search_var.get().lower()
-        if keyword:
-            # Apply filtering only if there is a keyword
-            filtered_tasks = [task for task in self.tasks if keyword in task["task"].lower()]
-            self.update_task_list(filtered_tasks)
-        else:
+    def filter_tasks(self, more=False):
+        """Show the best matching page of tasks; more=True appends the next page."""
+        keyword = self.search_var.get()
+        if not keyword.strip():
             # If the keyword is empty, show all tasks
-            self.update_task_list(self.tasks)
+            self.load_tasks()
+            return
+        if not more:
+            self.search_offset = 0
+            self.task_listbox.delete(0, tk.END)
+            self.task_ids = []
+        # Matching, filtering, ranking and paging all happen inside SQLite
+        rows = search_tasks(self.conn, self.username, keyword,
+                            priority=True if self.priority_only_var.get() else None,
+                            finished=False if self.hide_finished_var.get() else None,
+                            offset=self.search_offset)
+        self.search_offset += len(rows)
+        for task in rows:
+            self.show_task(tk.END, task)
 
     def save_tasks(self):
         # Save tasks for the specific user
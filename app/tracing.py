@@ -0,0 +1,208 @@
+"""Opt-in timing spans, counters and a slow-operation log.
+
+Off by default, and then a span or counter costs one flag check. Turn it on
+with the environment (or enable() from code):
+
+    TODO_TRACE=1               record spans and counters
+    TODO_TRACE_SLOW_MS=100     report spans slower than this on stderr
+    TODO_TRACE_FILE=trace.json where the trace is written on exit and by dump()
+    TODO_PROFILE=app.pstats    also run cProfile on the main thread, for pstats/snakeviz
+
+    with tracing.span("db.fetch", username=username) as s:
+        rows = ...
+        s.set(rows=len(rows))
+
+    @tracing.traced("crypt.pbkdf2")
+    def derive_key(...): ...
+
+    tracing.count("journal.bytes", len(data))
+
+    tracing.record("ui.first_paint", login_started)  # From an earlier perf_counter()
+
+Spans nest per thread: each records its parent and depth. The most recent
+MAX_SPANS spans are kept in memory.
+"""
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+MAX_SPANS = 100000
+MAX_SLOW = 1000
+
+_enabled = os.environ.get("TODO_TRACE", "") not in ("", "0")
+slow_ms = float(os.environ.get("TODO_TRACE_SLOW_MS", 100))
+trace_file = os.environ.get("TODO_TRACE_FILE", "trace.json")
+
+spans = deque(maxlen=MAX_SPANS)
+slow = deque(maxlen=MAX_SLOW)
+counters = defaultdict(int)
+_lock = threading.Lock()
+_local = threading.local()
+_epoch = time.perf_counter()
+_profiler = None
+_profile_file = None
+
+def enabled():
+    return _enabled
+
+def enable(slow_threshold_ms=None):
+    global _enabled, slow_ms
+    _enabled = True
+    if slow_threshold_ms is not None:
+        slow_ms = slow_threshold_ms
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def reset():
+    with _lock:
+        spans.clear()
+        slow.clear()
+        counters.clear()
+
+class _Span:
+    __slots__ = ("name", "attrs", "start", "parent", "depth")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = (time.perf_counter() - self.start) * 1000
+        _local.stack.pop()
+        record = {"name": self.name, "ms": elapsed, "start_ms": (self.start - _epoch) * 1000,
+                  "parent": self.parent, "depth": self.depth, "thread": threading.current_thread().name}
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        record.update(self.attrs)
+        with _lock:
+            spans.append(record)
+            if elapsed >= slow_ms:
+                slow.append(record)
+        if elapsed >= slow_ms:
+            print(f"[trace] slow: {self.name} took {elapsed:.1f} ms" +
+                  "".join(f" {key}={value}" for key, value in self.attrs.items()), file=sys.stderr)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def span(name, **attrs):
+    """Time a block as a context manager; a shared no-op while tracing is off."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, attrs)
+
+def traced(name):
+    """Decorator form of span() for a whole function."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def record(name, start, **attrs):
+    """Record a span that began at an earlier time.perf_counter() reading, e.g. one taken in another window."""
+    if _enabled:
+        recorded = _Span(name, attrs)
+        recorded.__enter__()
+        recorded.start = start
+        recorded.__exit__(None, None, None)
+
+def count(name, n=1):
+    """Add n to a counter, e.g. rows read or bytes written."""
+    if _enabled:
+        with _lock:
+            counters[name] += n
+
+def summary():
+    """Per span name: calls, total, mean and max milliseconds."""
+    totals = {}
+    with _lock:
+        records = list(spans)
+    for record in records:
+        entry = totals.setdefault(record["name"], {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        entry["calls"] += 1
+        entry["total_ms"] += record["ms"]
+        entry["max_ms"] = max(entry["max_ms"], record["ms"])
+    for entry in totals.values():
+        entry["mean_ms"] = entry["total_ms"] / entry["calls"]
+    return totals
+
+def export_json(path=None):
+    """Write spans, counters, slow spans and a per-name summary to a JSON file."""
+    with _lock:
+        data = {"slow_ms": slow_ms, "counters": dict(counters), "slow": list(slow), "spans": list(spans)}
+    data["summary"] = summary()
+    with open(path or trace_file, "w") as f:
+        json.dump(data, f, indent=1)
+    return path or trace_file
+
+def start_profile(path=None):
+    """Start cProfile on the calling thread; stop_profile() or dump() writes the pstats file."""
+    global _profiler, _profile_file
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profile_file = path or "profile.pstats"
+        _profiler.enable()
+
+def stop_profile(path=None):
+    global _profiler
+    if _profiler is None:
+        return None
+    _profiler.disable()
+    path = path or _profile_file
+    _profiler.dump_stats(path)
+    _profiler = None
+    return path
+
+def dump():
+    """Write the trace, and a pstats snapshot if profiling, without stopping anything."""
+    written = [export_json()] if _enabled else []
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_profile_file)
+        _profiler.enable()
+        written.append(_profile_file)
+    return written
+
+if os.environ.get("TODO_PROFILE"):
+    start_profile(os.environ["TODO_PROFILE"])
+    atexit.register(stop_profile)
+if _enabled:
+    atexit.register(export_json)
@@ -0,0 +1,237 @@
+"""Seeded synthetic workloads for load and soak testing.
+
+    python workload.py generate json accounts.json --accounts 1000 --tasks-per-account 200 --seed 1
+    python workload.py generate sqlite todo_app.db --accounts 1000
+    python workload.py generate encrypted todo_app.db --accounts 1000
+    python workload.py trace trace.jsonl --accounts 1000 --ops 100000 --seed 2
+    python workload.py replay json accounts.json trace.jsonl
+
+The same seed always gives the same accounts, tasks and trace. Accounts are
+named user0, user1, ... and share one password, which is hashed once at a
+low bcrypt cost (the apps rehash it at the configured cost on first login).
+Task counts per account follow an exponential distribution around the mean.
+Texts mix short, medium and long descriptions, and a share of them contain
+accented, CJK, RTL and emoji words.
+
+Tasks are written straight into the store's files, not through the app:
+- JSON: one shard snapshot per account,
+- SQLite: executemany,
+- encrypted: batched encrypt_many through database.import_tasks.
+All generated encrypted accounts use one salt, so the password-derived key
+is computed once. That is fine for test data and must never happen for real
+accounts.
+
+A trace is a JSON Lines file of operations such as
+{"op": "add", "user": "user3", "text": "...", "priority": false},
+{"op": "complete", "user": "user3", "pick": 0.42},
+{"op": "filter", "user": "user3", "keyword": "report"} and
+{"op": "delete", "user": "user3", "pick": 0.9}.
+pick chooses a task by its relative position in the user's list at replay
+time, so a trace works against any backend and can also be written by hand
+or recorded elsewhere. replay prints per-operation latency statistics.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from accountstore import ShardedAccountStore
+from passwords import hash_password
+from taskservice import (TaskService, JsonBackend, SqliteBackend, EncryptedBackend, import_app_module,
+                         SQLITE_APP_DIR, ENCRYPTED_APP_DIR)
+
+PASSWORD = "password"
+# Generated accounts are hashed once at this cost
+SEED_ROUNDS = 4
+# (share, min words, max words) of short, medium and long task texts
+TEXT_LENGTHS = ((0.6, 2, 5), (0.3, 6, 15), (0.1, 30, 80))
+WORDS = ("buy", "call", "email", "review", "report", "meeting", "fix", "bug", "plan", "trip", "book", "pay",
+         "invoice", "groceries", "milk", "bread", "doctor", "dentist", "garden", "car", "clean", "kitchen",
+         "write", "draft", "budget", "quarterly", "team", "sync", "deploy", "release", "notes", "birthday")
+UNICODE_WORDS = ("café", "naïve", "Zürich", "façade", "Straße", "東京", "会议", "買い物", "Привет", "задача",
+                 "שלום", "مرحبا", "😀", "🚀", "✅", "🎉")
+TRACE_MIX = (("add", 0.4), ("complete", 0.25), ("filter", 0.25), ("delete", 0.1))
+
+def generate_tasks(rng, count, priority_ratio=0.2, finished_ratio=0.3, unicode_ratio=0.1):
+    """Yield count (text, priority, finished) tasks drawn from rng."""
+    for _ in range(count):
+        roll = rng.random()
+        for share, low, high in TEXT_LENGTHS:
+            if roll < share:
+                break
+            roll -= share
+        words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+        if rng.random() < unicode_ratio:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(UNICODE_WORDS))
+        yield (" ".join(words).capitalize(), rng.random() < priority_ratio, rng.random() < finished_ratio)
+
+def generate_accounts(seed, accounts, tasks_per_account, **mix):
+    """Yield (username, list of tasks) for every account, the same for the same seed."""
+    rng = random.Random(seed)
+    for i in range(accounts):
+        count = int(rng.expovariate(1 / tasks_per_account)) if tasks_per_account else 0
+        yield "user%d" % i, list(generate_tasks(rng, count, **mix))
+
+def write_json(path, accounts, password=PASSWORD):
+    store = ShardedAccountStore(path, autoflush=False)
+    store.load()
+    password_hash = hash_password(password, SEED_ROUNDS).decode('utf-8')
+    count = 0
+    for username, tasks in accounts:
+        store.apply({"op": "create_account", "username": username, "password_hash": password_hash})
+        store.tasks(username)[:] = [{"task": text, "priority": priority, "finished": finished}
+                                    for text, priority, finished in tasks]
+        store.save_tasks(username)  # One snapshot per shard, no journal
+        store.shards.pop(username)  # Keep memory flat across accounts
+        count += len(tasks)
+    store.compact()
+    return count
+
+def write_sqlite(path, accounts, password=PASSWORD):
+    sqlite_app = import_app_module(SQLITE_APP_DIR, "test_app")
+    conn = sqlite_app.connect_db(path)
+    sqlite_app.initialize_db(conn)
+    password_hash = hash_password(password, SEED_ROUNDS)
+    count = 0
+    with conn:
+        for username, tasks in accounts:
+            conn.execute("INSERT INTO accounts (username, password_hash) VALUES (?, ?)", (username, password_hash))
+            conn.executemany("INSERT INTO tasks (username, task, priority, finished) VALUES (?, ?, ?, ?)",
+                             [(username, text, int(priority), int(finished)) for text, priority, finished in tasks])
+            count += len(tasks)
+    conn.close()
+    return count
+
+def write_encrypted(path, accounts, password=PASSWORD):
+    database = import_app_module(ENCRYPTED_APP_DIR, "database")
+    crypt = import_app_module(ENCRYPTED_APP_DIR, "encryption_utils")
+    db = database.TaskDatabase(path)
+    database.initialize_db(db=db)
+    password_hash = hash_password(password, SEED_ROUNDS)
+    salt = crypt.new_salt()
+    key_encryption_key = crypt.Fernet(crypt.derive_key(password, salt))  # Derived once for every account
+    count = 0
+    for username, tasks in accounts:
+        data_key = crypt.new_data_key()
+        with db.connection() as conn:
+            conn.execute("INSERT INTO accounts (username, password_hash, salt, wrapped_key) VALUES (?, ?, ?, ?)",
+                         (username, password_hash, salt, key_encryption_key.encrypt(data_key).decode()))
+        count += database.import_tasks(username, tasks, crypt.SessionKey(username, data_key), db=db)
+    db.close()
+    return count
+
+WRITERS = {"json": write_json, "sqlite": write_sqlite, "encrypted": write_encrypted}
+BACKENDS = {"json": JsonBackend, "sqlite": SqliteBackend, "encrypted": EncryptedBackend}
+
+def generate_trace(seed, accounts, ops, mix=TRACE_MIX):
+    """Yield ops trace records, the same for the same seed."""
+    rng = random.Random(seed)
+    kinds = [kind for kind, _ in mix]
+    weights = [weight for _, weight in mix]
+    for _ in range(ops):
+        kind = rng.choices(kinds, weights)[0]
+        record = {"op": kind, "user": "user%d" % rng.randrange(accounts)}
+        if kind == "add":
+            text, priority, _ = next(generate_tasks(rng, 1))
+            record.update(text=text, priority=priority)
+        elif kind == "filter":
+            record["keyword"] = rng.choice(WORDS)
+        else:
+            record["pick"] = rng.random()
+        yield record
+
+def read_trace(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def replay(backend, trace, password=PASSWORD):
+    """Run trace records against a backend; returns {op: sorted latencies in ms}."""
+    services = {}  # username -> TaskService, logged in on first use
+    task_ids = {}  # username -> known task ids, re-read after deletes
+    latencies = {}
+    for record in trace:
+        username = record["user"]
+        service = services.get(username)
+        if service is None:
+            service = services[username] = TaskService.login(backend, username, password)
+            if service is None:
+                raise ValueError(f"cannot log in as {username!r}")
+        if task_ids.get(username) is None:
+            task_ids[username] = [task.id for task in service.tasks()]
+        ids = task_ids[username]
+        kind = record["op"]
+        start = time.perf_counter()
+        if kind == "add":
+            ids.append(service.add(record["text"], record.get("priority", False)))
+        elif kind == "filter":
+            service.search(record["keyword"])
+        elif ids and kind == "complete":
+            service.complete(ids[int(record["pick"] * len(ids))])
+        elif ids and kind == "delete":
+            service.delete(ids[int(record["pick"] * len(ids))])
+            task_ids[username] = None  # Positional ids (JSON) shift after a delete
+        latencies.setdefault(kind, []).append((time.perf_counter() - start) * 1000)
+    for values in latencies.values():
+        values.sort()
+    return latencies
+
+def _print_latencies(latencies):
+    print(f"{'op':<10} {'count':>8} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for kind, values in sorted(latencies.items()):
+        print(f"{kind:<10} {len(values):>8} {sum(values) / len(values):>9.3f} {values[len(values) // 2]:>8.3f} "
+              f"{values[int(len(values) * 0.95)]:>8.3f} {values[-1]:>8.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="write generated accounts into a store")
+    generate_parser.add_argument("target", choices=list(WRITERS))
+    generate_parser.add_argument("path")
+    generate_parser.add_argument("--accounts", type=int, default=100)
+    generate_parser.add_argument("--tasks-per-account", type=int, default=100, help="mean")
+    generate_parser.add_argument("--priority-ratio", type=float, default=0.2)
+    generate_parser.add_argument("--finished-ratio", type=float, default=0.3)
+    generate_parser.add_argument("--unicode-ratio", type=float, default=0.1)
+    generate_parser.add_argument("--seed", type=int, default=0)
+
+    trace_parser = commands.add_parser("trace", help="write a generated operation trace")
+    trace_parser.add_argument("path")
+    trace_parser.add_argument("--accounts", type=int, default=100)
+    trace_parser.add_argument("--ops", type=int, default=10000)
+    trace_parser.add_argument("--seed", type=int, default=0)
+
+    replay_parser = commands.add_parser("replay", help="run a trace against a store")
+    replay_parser.add_argument("target", choices=list(BACKENDS))
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("trace")
+
+    for subparser in (generate_parser, replay_parser):
+        subparser.add_argument("--password", default=PASSWORD)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        if os.path.exists(args.path):
+            sys.exit(f"{args.path} already exists; generate into a new store.")
+        accounts = generate_accounts(args.seed, args.accounts, args.tasks_per_account,
+                                     priority_ratio=args.priority_ratio, finished_ratio=args.finished_ratio,
+                                     unicode_ratio=args.unicode_ratio)
+        start = time.perf_counter()
+        count = WRITERS[args.target](args.path, accounts, args.password)
+        print(f"Wrote {args.accounts} accounts and {count} tasks in {time.perf_counter() - start:.1f} s.")
+    elif args.command == "trace":
+        with open(args.path, "w", encoding="utf-8") as f:
+            for record in generate_trace(args.seed, args.accounts, args.ops):
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    else:
+        backend = BACKENDS[args.target](args.path)
+        try:
+            _print_latencies(replay(backend, read_trace(args.trace), args.password))
+        finally:
+            backend.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Debounced write-behind persistence for the Tk front end."""
+import time
+import tracing
+
+# Flush once the UI has been quiet this long...
+FLUSH_DELAY_MS = 500
+# ...but never hold changes back for longer than this during a burst
+MAX_DELAY_MS = 3000
+
+class WriteBehindSaver:
+    """
+    Coalesces bursts of changes into one call of flush() scheduled with Tk's
+    after(). Call mark_dirty() after each change and flush() before exiting.
+    """
+
+    def __init__(self, root, flush, delay_ms=FLUSH_DELAY_MS, max_delay_ms=MAX_DELAY_MS):
+        self.root = root
+        self._flush = flush
+        self.delay_ms = delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.dirty = False
+        self._first_dirty = None
+        self._after_id = None
+
+    def mark_dirty(self):
+        now = time.monotonic()
+        if not self.dirty:
+            self.dirty = True
+            self._first_dirty = now
+        self._cancel()
+        waited_ms = (now - self._first_dirty) * 1000
+        delay_ms = max(0, min(self.delay_ms, self.max_delay_ms - waited_ms))
+        self._after_id = self.root.after(int(delay_ms), self._on_timer)
+
+    def flush(self):
+        """Write out pending changes now."""
+        self._cancel()
+        if self.dirty:
+            self.dirty = False
+            self._first_dirty = None
+            with tracing.span("writebehind.flush"):
+                self._flush()
+
+    def _on_timer(self):
+        self._after_id = None
+        self.flush()
+
+    def _cancel(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None